@@ -0,0 +1,215 @@
+"""
+Responsive image variants for the web/ folder.
+
+`python manage.py build-assets` resizes the large images listed in ASSET_SOURCES
+into AVIF/WebP variants at a few widths, writes them under web/assets/ with
+content-hashed names (safe to cache forever) and records them in
+web/assets/manifest.json. At runtime the manifest is used to:
+  - rewrite <img> tags of served pages into <picture> elements with srcset
+    (responsive_page), and
+  - pick background variants in the browser (web/assets.js).
+Without a manifest everything falls back to the original files.
+"""
+import os
+import io
+import re
+import glob
+import json
+import html
+import hashlib
+import mimetypes
+import threading
+
+# (glob relative to the static folder, target widths in px)
+ASSET_SOURCES = [
+    ("backgrounds/*.jpg", [640, 1280, 1920]),
+    ("luvisa.png", [96, 192, 480, 960]),
+]
+
+# Preferred format first; the browser takes the first <source> it supports
+ASSET_FORMATS = [
+    ("avif", {"quality": 50}),
+    ("webp", {"quality": 78, "method": 6}),
+]
+
+ASSET_DIR = "assets"
+MANIFEST_NAME = "manifest.json"
+
+
+# -----------------------
+# Build (needs Pillow)
+# -----------------------
+def build_assets(static_folder, sources=ASSET_SOURCES, formats=ASSET_FORMATS):
+    """Generates every variant and the manifest. Returns the manifest."""
+    try:
+        from PIL import Image, ImageOps, features
+    except ImportError:
+        raise RuntimeError("Pillow is required to build assets: pip install pillow")
+
+    output_root = os.path.join(static_folder, ASSET_DIR)
+    images = {}
+    written = set()
+
+    for pattern, widths in sources:
+        for source_path in sorted(glob.glob(os.path.join(static_folder, pattern))):
+            relative = os.path.relpath(source_path, static_folder).replace(os.sep, "/")
+            stem, _ = os.path.splitext(relative)
+
+            with Image.open(source_path) as opened:
+                image = ImageOps.exif_transpose(opened)
+                image.load()
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+            entry = {
+                "type": mimetypes.guess_type(source_path)[0] or "application/octet-stream",
+                "width": image.width,
+                "height": image.height,
+                "bytes": os.path.getsize(source_path),
+                "variants": {}
+            }
+            targets = sorted({min(width, image.width) for width in widths})
+
+            for fmt, options in formats:
+                if not features.check(fmt):
+                    print(f"⚠️ This Pillow build has no {fmt.upper()} support; skipping {fmt} variants.")
+                    continue
+                variants = []
+                for width in targets:
+                    height = round(image.height * width / image.width)
+                    resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                    buffer = io.BytesIO()
+                    resized.save(buffer, fmt.upper(), **options)
+                    data = buffer.getvalue()
+
+                    digest = hashlib.sha256(data).hexdigest()[:10]
+                    url = f"{ASSET_DIR}/{stem}-{width}.{digest}.{fmt}"
+                    target = os.path.join(static_folder, *url.split("/"))
+                    if not os.path.exists(target):
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        with open(target, "wb") as f:
+                            f.write(data)
+                    written.add(os.path.normpath(target))
+                    variants.append({"width": width, "url": url, "bytes": len(data)})
+                entry["variants"][fmt] = variants
+            images[relative] = entry
+
+    _prune(output_root, written)
+    manifest = {"images": images}
+    os.makedirs(output_root, exist_ok=True)
+    with open(os.path.join(output_root, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def _prune(output_root, keep):
+    """Removes variants left over from previous builds."""
+    for path in glob.glob(os.path.join(output_root, "**", "*.*"), recursive=True):
+        if os.path.basename(path) != MANIFEST_NAME and os.path.normpath(path) not in keep:
+            os.remove(path)
+
+
+def savings_report(manifest):
+    """
+    Rows of {"image", "original", "<fmt>": bytes of the largest variant, "saved"}.
+    The largest variant is the worst case a browser downloads, so "saved" is a lower bound.
+    """
+    rows = []
+    for name, entry in sorted(manifest["images"].items()):
+        row = {"image": name, "original": entry["bytes"]}
+        for fmt, variants in entry["variants"].items():
+            if variants:
+                row[fmt] = variants[-1]["bytes"]
+        best = min([row[fmt] for fmt in entry["variants"] if fmt in row] or [entry["bytes"]])
+        row["saved"] = entry["bytes"] - best
+        rows.append(row)
+    return rows
+
+
+# -----------------------
+# Runtime
+# -----------------------
+_manifest_cache = {}
+_page_cache = {}
+_cache_lock = threading.Lock()
+
+_IMG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_ATTR_RE = re.compile(r'\b(src|sizes)="([^"]*)"', re.IGNORECASE)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def load_manifest(static_folder):
+    """The current manifest, re-read when the file changes; None if assets weren't built."""
+    path = os.path.join(static_folder, ASSET_DIR, MANIFEST_NAME)
+    mtime = _mtime(path)
+    if mtime is None:
+        return None
+    with _cache_lock:
+        cached = _manifest_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    with _cache_lock:
+        _manifest_cache[path] = (mtime, manifest)
+    return manifest
+
+
+def is_hashed_asset(filename):
+    """True for generated variants (content-hashed names), which never change once written."""
+    return filename.startswith(ASSET_DIR + "/") and filename != f"{ASSET_DIR}/{MANIFEST_NAME}"
+
+
+def _srcset(variants):
+    return ", ".join(f"{v['url']} {v['width']}w" for v in variants)
+
+
+def picture_markup(img_tag, entry):
+    """Wraps an <img> tag in a <picture> with one <source> per available format."""
+    attrs = dict((name.lower(), value) for name, value in _ATTR_RE.findall(img_tag))
+    sizes = attrs.get("sizes", "100vw")
+    sources = "".join(
+        f'<source type="image/{fmt}" srcset="{html.escape(_srcset(entry["variants"][fmt]))}" sizes="{html.escape(sizes)}">'
+        for fmt, _ in ASSET_FORMATS if entry["variants"].get(fmt)
+    )
+    # display:contents keeps the <img> laid out exactly as before
+    return f'<picture style="display:contents">{sources}{img_tag}</picture>'
+
+
+def rewrite_images(page, manifest):
+    images = manifest.get("images", {})
+
+    def replace(match):
+        tag = match.group(0)
+        src = dict((name.lower(), value) for name, value in _ATTR_RE.findall(tag)).get("src")
+        entry = images.get(src)
+        return picture_markup(tag, entry) if entry else tag
+
+    return _IMG_RE.sub(replace, page)
+
+
+def responsive_page(static_folder, filename):
+    """
+    Returns the page's HTML with responsive <picture> markup (cached until the page
+    or the manifest changes), or None when no manifest exists.
+    """
+    manifest = load_manifest(static_folder)
+    if manifest is None:
+        return None
+    page_path = os.path.join(static_folder, filename)
+    key = (_mtime(page_path), _mtime(os.path.join(static_folder, ASSET_DIR, MANIFEST_NAME)))
+    with _cache_lock:
+        cached = _page_cache.get(page_path)
+        if cached and cached[0] == key:
+            return cached[1]
+    with open(page_path, encoding="utf-8") as f:
+        page = rewrite_images(f.read(), manifest)
+    with _cache_lock:
+        _page_cache[page_path] = (key, page)
+    return page
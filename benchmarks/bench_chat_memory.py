@@ -0,0 +1,109 @@
+"""
+Prompt-size / latency benchmark: 100-message window vs rolling summary memory.
+
+Offline (default) it builds both prompts for a synthetic long-term user and
+reports estimated prompt tokens. With --live (needs GROQ_API_KEY) it also sends
+both prompts to Groq, and reports usage.prompt_tokens and end-to-end latency.
+
+Usage:
+    python benchmarks/bench_chat_memory.py [--history 300] [--live] [--rounds 3]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+
+USER_LINES = [
+    "I had such a long day at work today, my manager kept changing the deadline",
+    "Do you remember what I told you about my sister's wedding next month?",
+    "I'm trying to get back into running, did 5k this morning",
+    "honestly I just feel a bit lonely tonight",
+    "my cat knocked over my coffee again haha",
+    "Can you help me plan what to cook for dinner with pasta, spinach and some cheese?",
+]
+LUVISA_LINES = [
+    "Aww, that sounds exhausting 🥺 I'm proud of you for getting through it. Want to tell me what happened?",
+    "Of course I remember! You were nervous about giving the speech. How is the preparation going? 💗",
+    "5k is amazing! Your future self is going to thank you so much for this. Did it feel good?",
+    "I'm right here with you tonight. You're not alone, okay? Tell me what's on your mind 💭",
+    "Hehe, your cat clearly wants your attention more than the coffee does 😄",
+    "Ooh, a creamy spinach pasta would be perfect! Sauté garlic, wilt the spinach, melt the cheese in...",
+]
+SAMPLE_SUMMARY = (
+    "The user works an office job with a demanding manager and frequent deadline changes. Their sister is "
+    "getting married next month and they will give a speech, which makes them nervous. They are getting back "
+    "into running (recently 5k) and have a clumsy cat. They sometimes feel lonely at night and appreciate "
+    "reassurance. They like simple home cooking, especially pasta."
+)
+
+
+def estimate_tokens(messages):
+    """tiktoken when available, otherwise ~4 characters per token."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return sum(len(encoding.encode(m["content"])) + 4 for m in messages)
+    except ImportError:
+        return sum(len(m["content"]) // 4 + 4 for m in messages)
+
+
+def synthetic_history(n, rng):
+    history = []
+    for i in range(n):
+        if i % 2 == 0:
+            history.append({"sender": "user", "message": rng.choice(USER_LINES)})
+        else:
+            history.append({"sender": "luvisa", "message": rng.choice(LUVISA_LINES)})
+    return history
+
+
+def live_call(messages):
+    client = main.get_groq_client()
+    started = time.perf_counter()
+    completion = client.chat.completions.create(model=main.GROQ_MODEL, messages=messages, temperature=1.0, max_tokens=800)
+    return time.perf_counter() - started, completion.usage.prompt_tokens
+
+
+def main_bench(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history", type=int, default=300, help="stored messages for the simulated user")
+    parser.add_argument("--live", action="store_true", help="also call Groq and time both prompts")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    history = synthetic_history(args.history, rng)
+    prompt = "What should I do this weekend?"
+
+    # Summary mode holds between CHAT_RECENT_WINDOW and CHAT_RECENT_WINDOW + CHAT_SUMMARY_EVERY raw messages
+    uncovered = main.CHAT_RECENT_WINDOW + main.CHAT_SUMMARY_EVERY // 2
+    summary = SAMPLE_SUMMARY
+    if args.live:
+        summary = main.summarize_conversation(None, history[:-uncovered], "Alex") or SAMPLE_SUMMARY
+
+    variants = {
+        f"window ({main.CHAT_CONTEXT_MESSAGES} msgs)": main.build_chat_messages(prompt, history, "Alex"),
+        f"summary + {uncovered} msgs": main.build_chat_messages(prompt, history[-uncovered:], "Alex", summary),
+    }
+
+    for name, messages in variants.items():
+        line = f"{name:28s} messages={len(messages):4d}  est. prompt tokens={estimate_tokens(messages):6d}"
+        if args.live:
+            timings, prompt_tokens = [], None
+            for _ in range(args.rounds):
+                elapsed, prompt_tokens = live_call(messages)
+                timings.append(elapsed)
+            line += f"  groq prompt tokens={prompt_tokens:6d}  latency median={statistics.median(timings):.2f}s"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
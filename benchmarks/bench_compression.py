@@ -0,0 +1,124 @@
+"""
+Bytes-on-the-wire benchmark for response compression.
+
+Requests every text asset in web/ through the Flask test client with
+Accept-Encoding: identity / gzip / br (precompressed siblings are used when
+`python manage.py build-assets` has run), then compresses synthetic
+/api/chat_history and /api/together/history payloads through the same
+after_request hook and reports the transfer size and compression time.
+
+Usage:
+    python benchmarks/bench_compression.py [--messages 200] [--rounds 20]
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+import compression  # noqa: E402
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+LINES = [
+    "I had such a long day at work today, my manager kept changing the deadline",
+    "Aww, that sounds exhausting 🥺 I'm proud of you for getting through it. Want to tell me what happened?",
+    "Do you remember what I told you about my sister's wedding next month?",
+    "Of course I remember! You were nervous about giving the speech. How is the preparation going? 💗",
+    "my cat knocked over my coffee again haha",
+    "Hehe, your cat clearly wants your attention more than the coffee does 😄",
+]
+
+
+def chat_history_payload(n):
+    now = datetime.now(timezone.utc)
+    return {"success": True, "history": [
+        {"sender": "user" if i % 2 == 0 else "luvisa", "message": random.choice(LINES),
+         "timestamp": now.isoformat()}
+        for i in range(n)
+    ]}
+
+
+def together_history_payload(n):
+    now = datetime.now(timezone.utc)
+    return {"success": True, "ai_active": True, "cursor": n, "history": [
+        {"seq": i + 1, "sender": "user", "sender_name": random.choice(["Asha", "Ravi", "Meera"]),
+         "message": random.choice(LINES), "timestamp": now.isoformat()}
+        for i in range(n)
+    ]}
+
+
+def static_rows(client):
+    rows = []
+    static_folder = main.STATIC_FOLDER
+    for path in sorted(glob.glob(os.path.join(static_folder, "*.*"))):
+        filename = os.path.basename(path)
+        if os.path.splitext(filename)[1] not in (".css", ".js", ".html", ".svg"):
+            continue
+        row = {"name": filename}
+        for encoding in ENCODINGS:
+            response = client.get(f"/{filename}", headers={"Accept-Encoding": encoding})
+            row[encoding] = len(response.get_data())
+            response.close()
+        rows.append(row)
+    return rows
+
+
+def dynamic_rows(payloads, rounds):
+    rows = []
+    for name, payload in payloads:
+        row = {"name": name}
+        for encoding in ENCODINGS:
+            timings = []
+            for _ in range(rounds):
+                with main.app.test_request_context(headers={"Accept-Encoding": encoding}):
+                    response = main.jsonify(payload)
+                    start = time.perf_counter()
+                    response = compression.compress_response(response)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    row[encoding] = len(response.get_data())
+            row[f"{encoding}_ms"] = statistics.median(timings)
+        rows.append(row)
+    return rows
+
+
+def print_rows(title, rows, with_timing=False):
+    print(f"\n{title}")
+    print(f"{'':<28}" + "".join(f"{encoding:>12}" for encoding in ENCODINGS)
+          + ("".join(f"{encoding + ' ms':>12}" for encoding in ENCODINGS[1:]) if with_timing else ""))
+    for row in rows:
+        print(f"{row['name']:<28}" + "".join(f"{row[encoding]:>12}" for encoding in ENCODINGS)
+              + ("".join(f"{row[encoding + '_ms']:>12.2f}" for encoding in ENCODINGS[1:]) if with_timing else ""))
+    identity = sum(row["identity"] for row in rows)
+    best = sum(min(row[encoding] for encoding in ENCODINGS) for row in rows)
+    print(f"total: {identity} -> {best} bytes ({(identity - best) * 100 // max(identity, 1)}% smaller)")
+
+
+def main_bench(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200, help="messages in each JSON payload")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    if not compression.brotli:
+        print("⚠️ brotli is not installed: 'br' falls back to identity for dynamic responses.")
+
+    client = main.app.test_client()
+    print_rows("Static assets (bytes)", static_rows(client))
+    print_rows(f"JSON payloads, {args.messages} messages (bytes, median compression time)", dynamic_rows([
+        ("/api/chat_history", chat_history_payload(args.messages)),
+        ("/api/together/history", together_history_payload(args.messages)),
+    ], args.rounds), with_timing=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
@@ -0,0 +1,197 @@
+"""
+Load test: boots the app in-process against local stand-ins and runs scripted scenarios.
+
+Groq and Brevo are replaced by local fake servers (benchmarks/loadtest/fakes.py,
+with configurable latency). MongoDB is a local mongod given by --mongo-uri
+(use a throwaway instance; the run's data is removed afterwards) or, by default,
+an in-memory mongomock database (pip install mongomock), which is only good for
+comparing app-side changes. Every scenario reports throughput and p50/p95/p99
+per route; --out writes them as JSON and --compare diffs against an earlier file.
+
+Usage:
+    python benchmarks/bench_load.py [login_burst long_history_chat together_polling]
+        [--mongo-uri mongodb://localhost:27017] [--out results.json] [--compare baseline.json]
+        [--users 20] [--logins 5] [--history 500] [--chats 5]
+        [--spaces 5] [--members 4] [--duration 20] [--poll-interval 1] [--post-interval 3]
+        [--groq-first-token-ms 300] [--groq-token-ms 15] [--groq-tokens 60] [--groq-error-rate 0]
+        [--groq-secondary-first-token-ms 300] [--brevo-latency-ms 50]
+
+--groq-error-rate makes the fake Groq answer that share of requests with a 503;
+--groq-secondary-first-token-ms starts a second fake as GROQ_SECONDARY_BASE_URL,
+so the hedging and circuit breaker settings (GROQ_HEDGE_AFTER_SECONDS, ...) are
+exercised too.
+"""
+import os
+import sys
+import json
+import uuid
+import logging
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+from loadtest.fakes import FakeGroq, FakeBrevo  # noqa: E402
+from loadtest.scenarios import SCENARIOS, cleanup  # noqa: E402
+
+APP_ENV_KEYS = [
+    "BCRYPT_ROUNDS", "BCRYPT_WORKERS", "CHAT_MEMORY_MODE", "CHAT_CONTEXT_TOKENS",
+    "OTP_STORE", "EMAIL_WORKERS", "MONGO_MAX_POOL_SIZE", "COMPRESS_MIN_BYTES",
+    "GROQ_DEADLINE_SECONDS", "GROQ_HEDGE_AFTER_SECONDS", "GROQ_BREAKER_FAILURES", "GROQ_BREAKER_RESET_SECONDS",
+]
+
+
+def boot_app(args, groq, brevo, groq_secondary=None):
+    """Points the app at the fakes, imports it and serves it on a free port. Returns (base_url, db)."""
+    # main reads its configuration at import time
+    os.environ.update({
+        "GROQ_API_KEY": "loadtest",
+        "GROQ_BASE_URL": groq.base_url,
+        "GROQ_MODEL": groq.model,
+        "BREVO_API_KEY": "loadtest",
+        "BREVO_API_URL": brevo.api_url,
+        "BREVO_SENDER_EMAIL": "luvisa@loadtest.invalid",
+        "SESSION_SECRET": os.getenv("SESSION_SECRET") or uuid.uuid4().hex,
+    })
+    if groq_secondary is not None:
+        os.environ.update({"GROQ_SECONDARY_BASE_URL": groq_secondary.base_url, "GROQ_SECONDARY_MODEL": groq_secondary.model})
+    if args.mongo_uri:
+        os.environ["MONGODB_URI"] = args.mongo_uri
+
+    import main
+    import database
+
+    if args.mongo_uri:
+        db = main.get_db()
+        if db is None:
+            raise SystemExit(f"🔥 Could not connect to {args.mongo_uri}")
+        database.ensure_indexes(db)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("🔥 The in-memory stand-in needs mongomock (pip install mongomock), or pass --mongo-uri.")
+        db = mongomock.MongoClient().luvisa
+        database.ensure_indexes(db)
+        main.set_db(db)
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log per request
+    server = make_server("127.0.0.1", 0, main.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", db
+
+
+def print_report(name, report):
+    print(f"\n{name}  ({report['duration_s']:.1f}s)")
+    print(f"{'route':<20}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in report["routes"].items():
+        print(f"{route:<20}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def print_comparison(baseline, results):
+    print("\nvs baseline (p50 / p95 / p99 change in ms)")
+    for name, report in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for route, stats in report["routes"].items():
+            old = before["routes"].get(route)
+            if not old:
+                continue
+            deltas = " / ".join(f"{stats[key] - old[key]:+.1f}" for key in ("p50_ms", "p95_ms", "p99_ms"))
+            print(f"  {name:<20}{route:<20}{deltas}")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main_bench(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--mongo-uri", help="local mongod to test against (default: in-memory mongomock)")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier --out file to compare against")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--users", type=int, default=20, help="login_burst / long_history_chat users")
+    parser.add_argument("--logins", type=int, default=5, help="logins per user in login_burst")
+    parser.add_argument("--history", type=int, default=500, help="stored messages per user in long_history_chat")
+    parser.add_argument("--chats", type=int, default=5, help="chat rounds per user in long_history_chat")
+    parser.add_argument("--spaces", type=int, default=5)
+    parser.add_argument("--members", type=int, default=4, help="polling members per space")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of together polling")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--post-interval", type=float, default=3.0)
+    parser.add_argument("--groq-first-token-ms", type=int, default=300)
+    parser.add_argument("--groq-token-ms", type=int, default=15)
+    parser.add_argument("--groq-tokens", type=int, default=60, help="completion tokens per fake reply")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0, help="share of fake Groq requests answered with 503")
+    parser.add_argument("--groq-secondary-first-token-ms", type=int, help="also start a secondary fake Groq (hedging target)")
+    parser.add_argument("--brevo-latency-ms", type=int, default=50)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    import random
+    random.seed(args.seed)
+
+    groq = FakeGroq(args.groq_first_token_ms, args.groq_token_ms, args.groq_tokens, error_rate=args.groq_error_rate).start()
+    groq_secondary = None
+    if args.groq_secondary_first_token_ms is not None:
+        groq_secondary = FakeGroq(
+            args.groq_secondary_first_token_ms, args.groq_token_ms, args.groq_tokens, model="fake-secondary-model"
+        ).start()
+    brevo = FakeBrevo(args.brevo_latency_ms).start()
+    base_url, db = boot_app(args, groq, brevo, groq_secondary)
+    run_id = uuid.uuid4().hex[:8]
+    env = {"base_url": base_url, "db": db, "brevo": brevo, "run_id": run_id}
+
+    results = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "mongo": "mongod" if args.mongo_uri else "mongomock",
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare", "mongo_uri")},
+        # App settings that change the numbers, so runs are only compared like for like
+        "app_env": {key: os.getenv(key) for key in APP_ENV_KEYS if os.getenv(key) is not None},
+        "scenarios": {}
+    }
+    try:
+        for name in args.scenarios:
+            report = SCENARIOS[name](env, args).report()
+            results["scenarios"][name] = report
+            print_report(name, report)
+    finally:
+        if args.mongo_uri:
+            cleanup(db, run_id)
+        groq.stop()
+        if groq_secondary is not None:
+            groq_secondary.stop()
+        brevo.stop()
+    results["fake_groq_requests"] = groq.requests
+    if groq_secondary is not None:
+        results["fake_groq_secondary_requests"] = groq_secondary.requests
+    results["fake_brevo_messages"] = len(brevo.messages)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
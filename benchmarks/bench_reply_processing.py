@@ -0,0 +1,148 @@
+"""
+Micro-benchmark for reply post-processing.
+
+Checks that reply_processing produces byte-identical output to the original
+per-keyword implementation (kept verbatim below) on a generated corpus of
+replies, including streamed delivery in random chunk sizes, then times both.
+
+Usage:
+    python benchmarks/bench_reply_processing.py [--replies 2000] [--seed 7]
+"""
+import os
+import re
+import sys
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from reply_processing import (  # noqa: E402
+    INLINE_EMOJI_MAP, ReplyStreamEnhancer, add_emojis_to_response, enhance_reply, filter_response
+)
+
+
+# --- Original implementations (main.py before the single-pass rewrite) ---
+
+def legacy_add_emojis_to_response(response_text):
+    inline_emoji_map = {
+        "love": "❤️", "happy": "😊", "sad": "😥", "laugh": "😂", "smile": "😄", "cry": "😢",
+        "miss you": "🥺", "kiss": "😘", "hug": "🤗", "think": "🤔", "sweet": "🥰", "blush": "😊",
+        "heart": "❤️", "star": "⭐", "yay": "🎉", "oh no": "😟", "sorry": "😔", "please": "🙏",
+        "hi": "👋", "hello": "👋", "bye": "👋", "good night": "😴", "sleep": "😴", "dream": "💭"
+    }
+    if not isinstance(response_text, str):
+        response_text = str(response_text)
+    for keyword, emoji_char in inline_emoji_map.items():
+        pattern = r'\b' + re.escape(keyword) + r'\b'
+        response_text = re.sub(pattern, r'\g<0> ' + emoji_char, response_text, count=1, flags=re.IGNORECASE)
+    return response_text
+
+
+def legacy_filter_response(response_text):
+    if not isinstance(response_text, str):
+        response_text = str(response_text)
+    return (response_text
+            .replace("**OpenAI**", "Friendix.ai")
+            .replace("OpenAI", "Friendix.ai")
+            .replace("ChatGPT", "Friendix.ai")
+            .replace("OpenAI**", "Friendix.ai")
+            .replace("openai", "Friendix.ai")
+            .strip()
+            )
+
+
+# --- Corpus ---
+
+FILLER = ("you", "are", "my", "favourite", "person", "today", "and", "I", "was", "thinking", "this",
+          "things", "starry", "lovely", "hiking", "history", "chat", "sweeter", "nohi", "gpt", "Open",
+          "AI", "*", "**", "!", "?", "...", ",", "😊", "💖", "\n", "\n\n", "  ")
+BRANDING = ("OpenAI", "**OpenAI**", "ChatGPT", "openai", "OpenAI**", "OPENAI", "Openai")
+
+
+def make_corpus(n, rng):
+    keywords = list(INLINE_EMOJI_MAP)
+    corpus = [
+        "", "   ", "Hi", "hi!", "hello there hello", "  Hi, I love you \n",
+        "hi**OpenAI**", "**OpenAI**love", "**OpenAI**OpenAI**hi", "*OpenAI**OpenAI** hug",
+        "ChatGPThi sad", "Good Night, sweet dreams", "MISS YOU so much. Oh no!", "openai's love",
+    ]
+    for _ in range(n):
+        words = []
+        for _ in range(rng.randint(5, 120)):
+            roll = rng.random()
+            if roll < 0.25:
+                word = rng.choice(keywords)
+                word = word.upper() if rng.random() < 0.1 else (word.capitalize() if rng.random() < 0.2 else word)
+            elif roll < 0.32:
+                word = rng.choice(BRANDING)
+            else:
+                word = rng.choice(FILLER)
+            words.append(word)
+        joiner = rng.choice((" ", " ", "", "\n"))
+        corpus.append(rng.choice(("", " ", "\n")) + joiner.join(words) + rng.choice(("", " ", "\n ")))
+    return corpus
+
+
+def streamed(text, rng):
+    enhancer = ReplyStreamEnhancer()
+    out = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 12)
+        out.append(enhancer.feed(text[i:i + n]))
+        i += n
+    out.append(enhancer.finish())
+    return "".join(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--replies", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    corpus = make_corpus(args.replies, rng)
+
+    mismatches = 0
+    for text in corpus:
+        expected = legacy_add_emojis_to_response(legacy_filter_response(text))
+        checks = {
+            "enhance_reply": enhance_reply(text),
+            "streamed": streamed(text, rng),
+            "filter_response": filter_response(text),
+            "add_emojis_to_response": add_emojis_to_response(text),
+        }
+        references = {
+            "enhance_reply": expected,
+            "streamed": expected,
+            "filter_response": legacy_filter_response(text),
+            "add_emojis_to_response": legacy_add_emojis_to_response(text),
+        }
+        for name, got in checks.items():
+            if got != references[name]:
+                mismatches += 1
+                print(f"🔥 {name} mismatch for {text!r}:\n   expected {references[name]!r}\n   got      {got!r}")
+
+    total_chars = sum(len(t) for t in corpus)
+    print(f"Corpus: {len(corpus)} replies, {total_chars} chars. Mismatches: {mismatches}")
+
+    def run_legacy():
+        for text in corpus:
+            legacy_add_emojis_to_response(legacy_filter_response(text))
+
+    def run_single_pass():
+        for text in corpus:
+            enhance_reply(text)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=args.repeat))
+    single = min(timeit.repeat(run_single_pass, number=1, repeat=args.repeat))
+    print(f"legacy filter+emoji:   {legacy * 1e6 / len(corpus):8.1f} µs/reply")
+    print(f"single-pass enhance:   {single * 1e6 / len(corpus):8.1f} µs/reply  ({legacy / single:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
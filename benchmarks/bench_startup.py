@@ -0,0 +1,76 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import main and build the app.
+
+Each round starts a new interpreter (as a gunicorn worker boot or recycle does),
+times `import main` and `main.create_app()`, and checks the median against
+--target. With --importtime it also lists the slowest imports (python -X importtime).
+Nothing should connect during boot, so this runs without MONGODB_URI / GROQ_API_KEY.
+
+Usage:
+    python benchmarks/bench_startup.py [--rounds 5] [--target 0.5] [--importtime]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+BOOT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app()
+ready = time.perf_counter()
+print(json.dumps({"import": imported - start, "boot": ready - start, "db_connected": main._db is not None}))
+"""
+
+
+def boot_once():
+    result = subprocess.run([sys.executable, "-c", BOOT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    """(cumulative microseconds, module) of the slowest imports made directly by main."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and name.startswith("   ") and not name.startswith("    "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main_bench(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--target", type=float, default=0.5, help="max median boot time in seconds")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    args = parser.parse_args(argv)
+
+    runs = [boot_once() for _ in range(args.rounds)]
+    import_median = statistics.median(run["import"] for run in runs)
+    boot_median = statistics.median(run["boot"] for run in runs)
+    print(f"import main:         median={import_median * 1000:7.1f} ms  max={max(r['import'] for r in runs) * 1000:7.1f} ms")
+    print(f"import + create_app: median={boot_median * 1000:7.1f} ms  max={max(r['boot'] for r in runs) * 1000:7.1f} ms")
+    if any(run["db_connected"] for run in runs):
+        print("⚠️ The database connected during boot; it should connect on first use.")
+
+    if args.importtime:
+        print("\nslowest imports (cumulative):")
+        for cumulative, name in slowest_imports(10):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    ok = boot_median <= args.target
+    print(f"\n{'✅' if ok else '🔥'} median boot {boot_median:.3f}s (target {args.target:.3f}s)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
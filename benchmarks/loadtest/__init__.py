@@ -0,0 +1,5 @@
+"""
+Load-test harness: local stand-ins for Groq and Brevo (fakes), a threaded
+HTTP load driver with per-route percentiles (driver), and scripted scenarios
+(scenarios). Run it through benchmarks/bench_load.py.
+"""
@@ -0,0 +1,106 @@
+"""
+Load driver: virtual users on threads, each with its own keep-alive session,
+recording every request's latency under a route name; report() turns that into
+throughput and p50/p95/p99 per route.
+"""
+import math
+import time
+import threading
+from collections import defaultdict
+
+import requests
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self._samples = defaultdict(list)  # route -> [(seconds, ok)]
+        self._statuses = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self.started = None
+        self.finished = None
+
+    def record(self, route, seconds, status):
+        ok = status is not None and status < 400
+        with self._lock:
+            self._samples[route].append((seconds, ok))
+            self._statuses[route][str(status) if status is not None else "error"] += 1
+
+    def report(self):
+        duration = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        routes = {}
+        for route, samples in sorted(self._samples.items()):
+            latencies = sorted(seconds for seconds, _ in samples)
+            routes[route] = {
+                "requests": len(samples),
+                "errors": sum(1 for _, ok in samples if not ok),
+                "throughput_rps": round(len(samples) / duration, 2) if duration > 0 else None,
+                "p50_ms": _ms(percentile(latencies, 0.50)),
+                "p95_ms": _ms(percentile(latencies, 0.95)),
+                "p99_ms": _ms(percentile(latencies, 0.99)),
+                "max_ms": _ms(latencies[-1]),
+                "statuses": dict(self._statuses[route])
+            }
+        return {"duration_s": round(duration, 3), "routes": routes}
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class Client:
+    """One virtual user: a keep-alive session that records each call on the shared Recorder."""
+
+    def __init__(self, base_url, recorder, timeout=60):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.token = None
+
+    def request(self, route, method, path, expect_stream=False, **kwargs):
+        """Returns the response (None on a connection error); SSE bodies are read to the end."""
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, headers=headers, timeout=self.timeout, stream=expect_stream, **kwargs
+            )
+            if expect_stream:
+                for _ in response.iter_content(chunk_size=None):
+                    pass
+        except requests.RequestException:
+            self.recorder.record(route, time.perf_counter() - start, None)
+            return None
+        self.recorder.record(route, time.perf_counter() - start, response.status_code)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def run_clients(count, target):
+    """Runs target(index) on `count` threads and waits for all of them; re-raises the first failure."""
+    errors = []
+
+    def run(index):
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,207 @@
+"""
+Local stand-ins for the external services, each an HTTP server on a free port.
+
+FakeGroq speaks the OpenAI-compatible chat completions API the Groq SDK uses
+(point GROQ_BASE_URL at it), with a configurable time to first token and
+per-token delay and an optional share of 503 answers (a degraded provider, for
+the hedging / circuit breaker paths), and reports usage like Groq does
+(x_groq.usage on the last stream chunk). FakeBrevo accepts /v3/smtp/email and keeps the sent messages,
+so scenarios can read signup OTPs back.
+"""
+import re
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = (
+    "Aww I'm right here with you, tell me everything that happened today and how it made you feel, "
+    "I always love hearing from you and I'm so proud of how you keep going even on the hard days"
+).split()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that hang up early (timeouts, hedged requests that lost) are expected here
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class _Server:
+    """Runs `handler` on 127.0.0.1:<free port> in a daemon thread."""
+
+    def __init__(self, handler):
+        self.httpd = _HTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# -----------------------
+# Groq
+# -----------------------
+class _GroqHandler(_Handler):
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": self.server.fake.model, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        fake = self.server.fake
+        request = self._read_json()
+        fake.count_request()
+        if fake.error_rate and random.random() < fake.error_rate:
+            time.sleep(fake.first_token_seconds)
+            self._send_json(503, {"error": {"message": "over capacity", "type": "service_unavailable"}})
+            return
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in request.get("messages", [])) // 4
+        words = [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(min(fake.completion_tokens, request.get("max_tokens") or 10 ** 6))]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+        created = int(time.time())
+
+        if not request.get("stream"):
+            time.sleep(fake.first_token_seconds + fake.token_seconds * len(words))
+            self._send_json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": request.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(fake.first_token_seconds)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(fake.token_seconds)
+            self._chunk(created, request.get("model"), {"content": ("" if i == 0 else " ") + word}, None)
+        self._chunk(created, request.get("model"), {}, "stop", {"usage": usage})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _chunk(self, created, model, delta, finish_reason, x_groq=None):
+        chunk = {
+            "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        if x_groq:
+            chunk["x_groq"] = dict(x_groq, id="req-fake")
+        self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeGroq(_Server):
+    def __init__(self, first_token_ms=300, token_ms=15, completion_tokens=60, model="fake-model", error_rate=0.0):
+        super().__init__(_GroqHandler)
+        self.first_token_seconds = first_token_ms / 1000
+        self.token_seconds = token_ms / 1000
+        self.completion_tokens = completion_tokens
+        self.model = model
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        """Value for GROQ_BASE_URL (the SDK appends /openai/v1/...)."""
+        return self.url
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+
+# -----------------------
+# Brevo
+# -----------------------
+class _BrevoHandler(_Handler):
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/account"):
+            self._send_json(200, {"email": "loadtest@example.com"})
+        else:
+            self._send_json(404, {"message": "not found"})
+
+    def do_POST(self):
+        if not self.path.endswith("/smtp/email"):
+            self._send_json(404, {"message": "not found"})
+            return
+        payload = self._read_json()
+        fake = self.server.fake
+        time.sleep(fake.latency_seconds)
+        fake.record(payload)
+        self._send_json(201, {"messageId": f"<fake-{len(fake.messages)}@loadtest>"})
+
+
+class FakeBrevo(_Server):
+    def __init__(self, latency_ms=50):
+        super().__init__(_BrevoHandler)
+        self.latency_seconds = latency_ms / 1000
+        self.messages = []
+        self._lock = threading.Condition()
+
+    @property
+    def api_url(self):
+        """Value for BREVO_API_URL."""
+        return f"{self.url}/v3/smtp/email"
+
+    def record(self, payload):
+        with self._lock:
+            self.messages.append(payload)
+            self._lock.notify_all()
+
+    def wait_for_otp(self, email, timeout=30):
+        """The 6-digit code in the newest message sent to `email`."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                for payload in reversed(self.messages):
+                    if any(to.get("email") == email for to in payload.get("to", [])):
+                        match = re.search(r"\b(\d{6})\b", payload.get("htmlContent") or payload.get("textContent") or "")
+                        if match:
+                            return match.group(1)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no OTP email for {email}")
+                self._lock.wait(remaining)
@@ -0,0 +1,180 @@
+"""
+Scripted load scenarios. Each takes (env, options) and returns a driver.Recorder
+whose timing covers only the measured phase (setup runs before it starts).
+
+env: base_url of the app, db (the app's database), brevo (FakeBrevo), run_id.
+"""
+import time
+import random
+from datetime import datetime, timedelta, timezone
+
+import database
+
+from .driver import Client, Recorder, run_clients
+
+EMAIL_DOMAIN = "loadtest.invalid"
+PASSWORD = "load-test-password"
+
+USER_LINES = [
+    "I had such a long day at work today, my manager kept changing the deadline",
+    "Do you remember what I told you about my sister's wedding next month?",
+    "I'm trying to get back into running, did 5k this morning",
+    "honestly I just feel a bit lonely tonight",
+]
+LUVISA_LINES = [
+    "Aww, that sounds exhausting 🥺 I'm proud of you for getting through it. Want to tell me what happened?",
+    "Of course I remember! You were nervous about giving the speech. How is the preparation going? 💗",
+    "5k is amazing! Your future self is going to thank you so much for this. Did it feel good?",
+    "I'm right here with you tonight. You're not alone, okay? Tell me what's on your mind 💭",
+]
+
+
+def _email(env, kind, index):
+    return f"{kind}-{env['run_id']}-{index}@{EMAIL_DOMAIN}"
+
+
+def _login(client, email, route="login"):
+    response = client.request(route, "POST", "/api/login", json={"email": email, "password": PASSWORD})
+    if response is None or response.status_code != 200:
+        raise RuntimeError(f"login failed for {email}: {response.status_code if response is not None else 'no response'}")
+    client.token = response.json().get("session_token")
+
+
+def login_burst(env, options):
+    """
+    `users` new accounts sign up at once through the OTP flow (OTPs are read back
+    from the fake Brevo), then every user logs in `logins` times back to back.
+    Exercises the bcrypt pool, the OTP store and the email queue.
+    """
+    recorder = Recorder()
+
+    def user(index):
+        client = Client(env["base_url"], recorder)
+        email = _email(env, "burst", index)
+        try:
+            client.request("send_otp", "POST", "/api/send_otp", json={"email": email})
+            otp = env["brevo"].wait_for_otp(email)
+            client.request("verify_otp", "POST", "/api/verify_otp", json={"email": email, "otp": otp})
+            client.request("signup_verified", "POST", "/api/signup_verified", json={"email": email, "password": PASSWORD})
+            for _ in range(options.logins):
+                client.request("login", "POST", "/api/login", json={"email": email, "password": PASSWORD})
+        finally:
+            client.close()
+
+    recorder.started = time.perf_counter()
+    run_clients(options.users, user)
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+def long_history_chat(env, options):
+    """
+    `users` accounts with `history` stored messages each send `chats` rounds of
+    /api/chat, /api/chat/stream and /api/chat_history concurrently. Exercises
+    context loading and packing, and the Groq round trip (fake latency).
+    """
+    db = env["db"]
+    setup = Recorder()
+    clients = []
+    start_time = datetime.now(timezone.utc) - timedelta(minutes=options.history)
+    for index in range(options.users):
+        email = _email(env, "history", index)
+        user_id = database.register_user(db, email, PASSWORD)
+        for i in range(options.history):
+            sender, lines = ("user", USER_LINES) if i % 2 == 0 else ("luvisa", LUVISA_LINES)
+            database.add_message_to_history(db, user_id, sender, random.choice(lines), start_time + timedelta(minutes=i))
+        client = Client(env["base_url"], setup)
+        _login(client, email)
+        clients.append(client)
+
+    recorder = Recorder()
+
+    def user(index):
+        client = clients[index]
+        client.recorder = recorder
+        try:
+            for _ in range(options.chats):
+                client.request("chat", "POST", "/api/chat", json={"text": random.choice(USER_LINES)})
+                client.request("chat_stream", "POST", "/api/chat/stream", json={"text": random.choice(USER_LINES)}, expect_stream=True)
+                client.request("chat_history", "GET", "/api/chat_history")
+        finally:
+            client.close()
+
+    recorder.started = time.perf_counter()
+    run_clients(len(clients), user)
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+def together_polling(env, options):
+    """
+    `spaces` together spaces with `members` members each, for `duration` seconds:
+    every member polls /api/together/history (since-cursor + ETag) every
+    `poll_interval` seconds, and the first member of each space posts every
+    `post_interval` seconds (Luvisa replies through the fake Groq).
+    """
+    setup_client = Client(env["base_url"], Recorder())
+    space_ids = []
+    for index in range(options.spaces):
+        response = setup_client.request("create", "POST", "/api/together/create", json={
+            "space_name": f"lt-{env['run_id']}-{index}", "password": PASSWORD, "with_ai": True
+        })
+        if response is None or response.status_code not in (200, 201):
+            raise RuntimeError(f"could not create space {index}: {response.status_code if response is not None else 'no response'}")
+        space_ids.append(response.json()["space_id"])
+    setup_client.close()
+
+    recorder = Recorder()
+    deadline = time.monotonic() + options.duration
+
+    def member(index):
+        space_id = space_ids[index // options.members]
+        is_poster = index % options.members == 0
+        client = Client(env["base_url"], recorder)
+        cursor, etag = -1, None
+        next_post = time.monotonic() + random.uniform(0, options.post_interval)
+        # Spread the members over the interval, like independent browsers
+        time.sleep(random.uniform(0, options.poll_interval))
+        try:
+            while time.monotonic() < deadline:
+                if is_poster and time.monotonic() >= next_post:
+                    client.request("together_chat", "POST", "/api/together/chat", json={
+                        "space_id": space_id, "text": random.choice(USER_LINES), "sender_name": f"member-{index}"
+                    })
+                    next_post += options.post_interval
+                headers = {"If-None-Match": etag} if etag else {}
+                response = client.request(
+                    "together_history", "GET", f"/api/together/history?space_id={space_id}&since={cursor}", headers=headers
+                )
+                if response is not None and response.status_code == 200:
+                    cursor = response.json().get("cursor", cursor)
+                    etag = response.headers.get("ETag")
+                time.sleep(options.poll_interval)
+        finally:
+            client.close()
+
+    recorder.started = time.perf_counter()
+    run_clients(options.spaces * options.members, member)
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+SCENARIOS = {
+    "login_burst": login_burst,
+    "long_history_chat": long_history_chat,
+    "together_polling": together_polling,
+}
+
+
+def cleanup(db, run_id):
+    """Removes what a run created (for runs against a real mongod)."""
+    users = list(db.users.find({"email": {"$regex": f"-{run_id}-\\d+@{EMAIL_DOMAIN}$"}}, {"_id": 1}))
+    user_ids = [user["_id"] for user in users]
+    if user_ids:
+        db.chats.delete_many({"user_id": {"$in": user_ids}})
+        db.users.delete_many({"_id": {"$in": user_ids}})
+    spaces = list(db.together_spaces.find({"name": {"$regex": f"^lt-{run_id}-"}}, {"_id": 1}))
+    space_ids = [space["_id"] for space in spaces]
+    if space_ids:
+        db.together_messages.delete_many({"space_id": {"$in": space_ids}})
+        db.together_spaces.delete_many({"_id": {"$in": space_ids}})
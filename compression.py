@@ -0,0 +1,135 @@
+"""
+Response compression.
+
+Static text assets get .br/.gz siblings at build time (precompress_static, run by
+`python manage.py build-assets`), and the static route serves the best one the
+client accepts. Dynamic JSON/HTML responses above COMPRESS_MIN_BYTES are
+compressed on the fly by compress_response (an after_request hook).
+Brotli is optional: without the `brotli` package dynamic responses use gzip only.
+"""
+import os
+import glob
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+
+DYNAMIC_TYPES = {"application/json", "text/html"}
+STATIC_PATTERNS = ["*.css", "*.js", "*.html", "*.svg", "assets/manifest.json"]
+
+# Preferred first
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def available_encodings():
+    """Encodings this process can produce on the fly."""
+    return (["br"] if brotli else []) + ["gzip"]
+
+
+def compress(data, encoding, static=False):
+    """Static (build-time) compression uses the slowest, smallest settings."""
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def choose_encoding(accept_encodings, candidates):
+    """First of `candidates` the client accepts (request.accept_encodings), or None."""
+    for encoding in candidates:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+# -----------------------
+# Static files
+# -----------------------
+def precompress_static(static_folder, patterns=STATIC_PATTERNS):
+    """
+    Writes .br/.gz next to every matching file when it is smaller than the original.
+    Returns rows of {"file", "original", "br", "gzip"} (bytes).
+    """
+    rows = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(static_folder, pattern))):
+            with open(path, "rb") as f:
+                data = f.read()
+            row = {"file": os.path.relpath(path, static_folder).replace(os.sep, "/"), "original": len(data)}
+            for encoding in available_encodings():
+                target = path + SUFFIXES[encoding]
+                compressed = compress(data, encoding, static=True)
+                if len(compressed) < len(data):
+                    with open(target, "wb") as f:
+                        f.write(compressed)
+                    row[encoding] = len(compressed)
+                elif os.path.exists(target):
+                    os.remove(target)
+            rows.append(row)
+    return rows
+
+
+def precompressed_variants(static_folder, filename):
+    """Encodings with a precompressed sibling of `filename`; siblings older than the file are ignored."""
+    source_mtime = _mtime(os.path.join(static_folder, filename))
+    if source_mtime is None:
+        return []
+    fresh = []
+    for encoding, suffix in SUFFIXES.items():
+        variant_mtime = _mtime(os.path.join(static_folder, filename + suffix))
+        if variant_mtime is not None and variant_mtime >= source_mtime:
+            fresh.append(encoding)
+    return fresh
+
+
+def has_precompressed(static_folder, patterns=STATIC_PATTERNS):
+    """True if precompress_static has written at least one .br/.gz sibling."""
+    return any(
+        os.path.exists(path + suffix)
+        for pattern in patterns
+        for path in glob.glob(os.path.join(static_folder, pattern))
+        for suffix in SUFFIXES.values()
+    )
+
+
+# -----------------------
+# Dynamic responses
+# -----------------------
+def compress_response(response):
+    """after_request hook: compresses JSON/HTML bodies of at least COMPRESS_MIN_BYTES."""
+    if (response.direct_passthrough
+            or response.is_streamed
+            or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in DYNAMIC_TYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = choose_encoding(request.accept_encodings, available_encodings())
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    # The compressed body is a different representation; keep conditional requests
+    # working by downgrading the validator to a weak ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,60 @@
+"""
+Token-budgeted prompt context.
+
+Each stored message carries its token count (computed once, when it is written),
+so packing history into a prompt budget never re-tokenizes old messages.
+"""
+
+# Chat-format overhead per message (role + separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    # Loaded on first use: the encoding file may have to be downloaded, which shouldn't slow boot
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Optional dependency (or its encoding file) unavailable: fall back to ~4 chars per token
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    """Number of tokens in `text` (estimated when tiktoken isn't installed)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message):
+    """Prompt cost of a stored message, using its cached count when present."""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = count_tokens(message.get("message", ""))
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+def pack_history(history, budget):
+    """
+    Returns the longest suffix of `history` (oldest -> newest) whose total
+    message_tokens fits in `budget`, i.e. packs newest-first.
+    """
+    used = 0
+    start = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        cost = message_tokens(history[i])
+        if used + cost > budget:
+            break
+        used += cost
+        start = i
+    return history[start:]
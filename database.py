@@ -1,13 +1,19 @@
 import os
-import bcrypt
+import time
+import hashlib
+import threading
 import mimetypes
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from bson.objectid import ObjectId
 from bson.binary import Binary, BINARY_SUBTYPE
 from pymongo.errors import DuplicateKeyError, OperationFailure
+from context_builder import count_tokens
+import passwords
 
 # --- Config and Connection ---
 
@@ -16,13 +22,27 @@ def load_config():
     load_dotenv()
     print("✅ Environment variables loaded.")
 
-def get_db():
+def mongo_client_options():
+    """
+    Connection-pool and timeout settings for MongoClient, from the environment.
+    The timeouts are short on purpose: a request waiting on an unreachable cluster
+    or an exhausted pool should fail in seconds, not hang a worker thread for 30s.
+    """
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    }
+
+def get_db(create_indexes=True, event_listeners=()):
     """Connects to MongoDB and returns the database object."""
     uri = os.getenv("MONGODB_URI") or os.getenv("MONGODB_URI".upper())
     if not uri:
         raise ValueError("MONGODB_URI must be set in .env")
 
-    client = MongoClient(uri, server_api=ServerApi('1'))
+    client = MongoClient(uri, server_api=ServerApi('1'), event_listeners=list(event_listeners), **mongo_client_options())
 
     # Ping to confirm connection
     client.admin.command('ping')
@@ -31,37 +51,149 @@ def get_db():
     # Keep original DB name (luvisa) to remain backwards compatible
     db = client.luvisa
 
-    # Ensure unique index on email (safe to call multiple times)
-    try:
-        db.users.create_index("email", unique=True)
-    except OperationFailure as e:
-        # If index creation fails for some reason, log it but continue
-        print(f"⚠️ Warning: Could not create unique index on users.email: {e}")
+    # Ensure all registered indexes exist (safe to call multiple times)
+    if create_indexes:
+        ensure_indexes(db)
 
     return db
 
+# --- Index Management ---
+
+# How long completed idempotency keys are remembered (TTL index on created_at)
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 24 * 3600))
+
+# Declarative registry: (collection, keys, options). Applied idempotently by ensure_indexes.
+INDEXES = [
+    ("users", [("email", 1)], {"unique": True}),
+    ("users", [("profile.friend_id", 1)], {}),
+    ("users", [("created_at", 1)], {}),
+    ("chats", [("user_id", 1), ("timestamp", 1)], {}),
+    ("together_spaces", [("name", 1), ("expires_at", 1)], {}),
+    ("together_spaces", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ("together_messages", [("space_id", 1), ("seq", 1)], {"unique": True}),
+    ("together_messages", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ("password_resets", [("email", 1), ("otp", 1), ("expires_at", 1)], {}),
+    ("idempotency_keys", [("created_at", 1)], {"expireAfterSeconds": IDEMPOTENCY_KEY_TTL_SECONDS}),
+    ("otp_codes", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+]
+
+# Hot queries that must be served by an index: (name, collection, filter, sort)
+_SAMPLE_ID = ObjectId("000000000000000000000000")
+HOT_QUERIES = [
+    ("user by email", "users", {"email": "probe@example.com"}, None),
+    ("user by friend_id", "users", {"profile.friend_id": "FRD-000000"}, None),
+    ("chat history window", "chats", {"user_id": _SAMPLE_ID}, [("timestamp", -1)]),
+    ("active space by name", "together_spaces", {"name": "probe", "expires_at": {"$gt": datetime(1970, 1, 1)}}, None),
+    ("space messages since", "together_messages", {"space_id": _SAMPLE_ID, "seq": {"$gt": -1}}, [("seq", 1)]),
+    ("password reset lookup", "password_resets", {"email": "probe@example.com", "otp": "000000", "expires_at": {"$gt": 0}}, None),
+]
+
+def _normalize_keys(keys):
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys]
+
+def ensure_indexes(db):
+    """Creates every index in INDEXES. Existing indexes are left untouched."""
+    for collection, keys, options in INDEXES:
+        try:
+            db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            # If index creation fails for some reason, log it but continue
+            print(f"⚠️ Warning: Could not create index on {collection} {keys}: {e}")
+
+def _plan_stages(plan):
+    """Collects every 'stage' name found in an explain() plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+def verify_hot_queries(db):
+    """
+    Runs explain() on every HOT_QUERIES entry.
+    Returns a list of {"name", "collection", "stages", "ok"}; ok means the winning plan is an IXSCAN.
+    """
+    results = []
+    for name, collection, query, sort in HOT_QUERIES:
+        try:
+            cursor = db[collection].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+            stages = _plan_stages(winning_plan)
+            ok = "IXSCAN" in stages and "COLLSCAN" not in stages
+        except Exception as e:
+            print(f"🔥 Error explaining '{name}': {e}")
+            stages, ok = [], False
+        results.append({"name": name, "collection": collection, "stages": stages, "ok": ok})
+    return results
+
+def index_report(db):
+    """
+    Compares the registry against what exists on the server.
+    Returns {"missing": [...], "undeclared": [...], "unused": [...]}:
+    - missing: registered but not present
+    - undeclared: present but not in the registry (excluding _id)
+    - unused: present with zero accesses in $indexStats since the server started
+    """
+    report = {"missing": [], "undeclared": [], "unused": []}
+    declared = {}
+    for collection, keys, _ in INDEXES:
+        declared.setdefault(collection, []).append(_normalize_keys(keys))
+
+    for collection, declared_keys in declared.items():
+        existing = db[collection].index_information()
+        existing_keys = {name: _normalize_keys(info["key"]) for name, info in existing.items()}
+
+        for keys in declared_keys:
+            if keys not in existing_keys.values():
+                report["missing"].append({"collection": collection, "keys": keys})
+
+        for name, keys in existing_keys.items():
+            if name != "_id_" and keys not in declared_keys:
+                report["undeclared"].append({"collection": collection, "name": name, "keys": keys})
+
+        try:
+            for stats in db[collection].aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and stats.get("accesses", {}).get("ops", 0) == 0:
+                    report["unused"].append({"collection": collection, "name": stats["name"]})
+        except OperationFailure as e:
+            print(f"⚠️ Warning: $indexStats unavailable for {collection}: {e}")
+
+    return report
+
 # --- User Operations ---
 
 def register_user(db, email, password):
     """Creates a new user with a default embedded profile."""
     try:
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = passwords.hash_password(password)
 
         # Create a default display name from the email
         display_name = email.split('@')[0].capitalize()
 
+        created_at = datetime.utcnow()
+        profile = {
+            "display_name": display_name,
+            "bio": "Hey there! I’m using Friendix",
+            "profile_pic": {
+                "data": None,
+                "content_type": None
+            }
+        }
+        # Permanent sequential ID, allocated atomically
+        profile.update(friend_id_fields(allocate_friend_number(db), created_at.year))
+
         user_document = {
             "email": email,
             "hashed_password": hashed_password,
-            "created_at": datetime.utcnow(),
-            "profile": {
-                "display_name": display_name,
-                "bio": "Hey there! I’m using Friendix",
-                "profile_pic": {
-                    "data": None,
-                    "content_type": None
-                }
-            }
+            "created_at": created_at,
+            "profile": profile
         }
 
         result = db.users.insert_one(user_document)
@@ -75,9 +207,103 @@ def register_user(db, email, password):
         return None
 
 def get_user_by_email(db, email):
-    """Finds a user by their email."""
+    """Finds a user by their email (full document, including password hash and avatar bytes)."""
     return db.users.find_one({"email": email})
 
+# --- Identity Lookups (hot path) ---
+
+# Everything routes need to identify a user and render a profile, but no avatar bytes or password hash
+IDENTITY_PROJECTION = {
+    "email": 1,
+    "created_at": 1,
+    "profile.display_name": 1,
+    "profile.bio": 1,
+    "profile.creation_year": 1,
+    "profile.friend_id": 1,
+    "profile.friend_id_number": 1,
+    "profile.is_early_user": 1,
+    "profile.profile_pic.hash": 1,
+    "profile.profile_pic.content_type": 1,
+}
+
+IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", 30))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", 2048))
+
+class IdentityCache:
+    """
+    Short-TTL, size-bounded LRU of projected user documents keyed by email.
+    Only found users are cached, so signup checks always see new accounts.
+    Entries are invalidated on profile writes in this process; the TTL bounds
+    staleness for writes handled by other workers.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # email -> (expires_at, user_doc)
+        self._emails_by_id = {}
+        self._lock = threading.Lock()
+
+    def get(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(email)
+                return None
+            self._entries.move_to_end(email)
+            return entry[1]
+
+    def put(self, email, user_doc):
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._remove(email)
+            self._entries[email] = (time.monotonic() + self.ttl_seconds, user_doc)
+            self._emails_by_id[user_doc["_id"]] = email
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            email = self._emails_by_id.get(ObjectId(user_id))
+            if email is not None:
+                self._remove(email)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._emails_by_id.clear()
+
+    def _remove(self, email):
+        entry = self._entries.pop(email, None)
+        if entry is not None:
+            self._emails_by_id.pop(entry[1]["_id"], None)
+
+identity_cache = IdentityCache(IDENTITY_CACHE_MAX_ENTRIES, IDENTITY_CACHE_TTL_SECONDS)
+
+def get_user_identity(db, email):
+    """
+    Finds a user by email with IDENTITY_PROJECTION, served from identity_cache when fresh.
+    The returned document is shared with the cache; treat it as read-only.
+    """
+    user_doc = identity_cache.get(email)
+    if user_doc is not None:
+        return user_doc
+    user_doc = db.users.find_one({"email": email}, IDENTITY_PROJECTION)
+    if user_doc is not None:
+        identity_cache.put(email, user_doc)
+    return user_doc
+
+def get_user_identity_by_id(db, user_id):
+    """Finds a user by _id with IDENTITY_PROJECTION (uncached)."""
+    try:
+        return db.users.find_one({"_id": ObjectId(user_id)}, IDENTITY_PROJECTION)
+    except Exception as e:
+        print(f"Error finding user by ID: {e}")
+        return None
+
 def get_user_by_id(db, user_id):
     """Finds a user by their _id."""
     try:
@@ -86,15 +312,161 @@ def get_user_by_id(db, user_id):
         print(f"Error finding user by ID: {e}")
         return None
 
-def check_user_password(user_doc, password):
-    """Checks a provided password against the user's hashed password."""
+# --- Friend ID Operations ---
+
+FRIEND_ID_COUNTER = "friend_id"
+EARLY_USER_LIMIT = 99
+
+def allocate_friend_number(db):
+    """Atomically reserves the next sequential friend number from the counters collection."""
+    counter = db.counters.find_one_and_update(
+        {"_id": FRIEND_ID_COUNTER},
+        {"$inc": {"seq": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        # First allocation ever: start after every number already handed out and every legacy
+        # user's signup position (legacy_friend_number) ($max keeps concurrent seeds safe)
+        db.counters.update_one(
+            {"_id": FRIEND_ID_COUNTER},
+            {"$max": {"seq": max(db.users.count_documents({}), highest_friend_number(db))}},
+            upsert=True
+        )
+        counter = db.counters.find_one_and_update(
+            {"_id": FRIEND_ID_COUNTER},
+            {"$inc": {"seq": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+    return counter["seq"]
+
+def highest_friend_number(db):
+    """The largest friend number stored on any profile (0 if none)."""
+    user = db.users.find_one(
+        {"profile.friend_id_number": {"$exists": True}},
+        {"profile.friend_id_number": 1},
+        sort=[("profile.friend_id_number", -1)]
+    )
+    try:
+        return int(user["profile"]["friend_id_number"]) if user else 0
+    except (TypeError, ValueError):
+        return 0
+
+def legacy_friend_number(db, user_doc):
+    """
+    A legacy user's position in signup order (created_at, then _id; missing created_at
+    first), i.e. the number backfill_friend_ids would give it. Counted on the
+    users.created_at index.
+    """
+    created_at = user_doc.get("created_at")
+    if created_at is None:
+        before = {"created_at": None, "_id": {"$lt": user_doc["_id"]}}
+    else:
+        before = {"$or": [
+            {"created_at": None},
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": user_doc["_id"]}}
+        ]}
+    return db.users.count_documents(before) + 1
+
+def friend_id_fields(sequential_number, creation_year):
+    """Builds the permanent profile fields for a sequential friend number."""
+    six_digit_id = f"{sequential_number:06d}"
+    return {
+        "creation_year": creation_year,
+        "friend_id": f"FRD-{six_digit_id}",
+        "friend_id_number": six_digit_id,
+        "is_early_user": 0 < sequential_number <= EARLY_USER_LIMIT
+    }
+
+def assign_friend_id(db, user_doc):
+    """
+    Gives a legacy user without a friend_id (signed up before numbers were allocated
+    at signup) its signup position, as before: signup order and is_early_user are
+    kept, and backfill_friend_ids later agrees with it.
+    Only the first concurrent caller wins; everyone gets the stored fields back.
+    """
+    creation_time = user_doc.get("created_at")
+    creation_year = creation_time.year if creation_time else user_doc["_id"].generation_time.year
+    fields = friend_id_fields(legacy_friend_number(db, user_doc), creation_year)
+
+    updated = db.users.find_one_and_update(
+        {"_id": user_doc["_id"], "profile.friend_id": {"$exists": False}},
+        {"$set": {f"profile.{key}": value for key, value in fields.items()}},
+        projection={"profile": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    identity_cache.invalidate_user(user_doc["_id"])
+    if updated is None:
+        updated = db.users.find_one({"_id": user_doc["_id"]}, {"profile": 1})
+    profile = updated.get("profile", {})
+    return {key: profile.get(key) for key in fields}
+
+def backfill_friend_ids(db, batch_size=500):
+    """
+    One-shot migration: numbers every user by signup order (created_at, then _id),
+    sets friend_id fields on users that don't have them yet, and moves the counter
+    past the highest number so new signups continue the sequence.
+    Returns the number of users updated.
+    """
+    cursor = db.users.find(
+        {}, {"_id": 1, "created_at": 1, "profile.friend_id": 1}
+    ).sort([("created_at", 1), ("_id", 1)]).batch_size(batch_size)
+
+    updated = 0
+    position = 0
+    operations = []
+    for user in cursor:
+        position += 1
+        if "friend_id" in user.get("profile", {}):
+            continue
+        creation_time = user.get("created_at")
+        creation_year = creation_time.year if creation_time else user["_id"].generation_time.year
+        fields = friend_id_fields(position, creation_year)
+        operations.append(UpdateOne(
+            {"_id": user["_id"], "profile.friend_id": {"$exists": False}},
+            {"$set": {f"profile.{key}": value for key, value in fields.items()}}
+        ))
+        if len(operations) >= batch_size:
+            updated += db.users.bulk_write(operations, ordered=False).modified_count
+            operations = []
+
+    if operations:
+        updated += db.users.bulk_write(operations, ordered=False).modified_count
+
+    db.counters.update_one({"_id": FRIEND_ID_COUNTER}, {"$max": {"seq": position}}, upsert=True)
+    print(f"✅ Backfilled friend IDs for {updated} users; counter is at least {position}.")
+    return updated
+
+def check_user_password(user_doc, password, db=None):
+    """
+    Checks a provided password against the user's hashed password.
+    With `db`, a hash made with a different cost than passwords.BCRYPT_ROUNDS is
+    upgraded in the background after a successful check.
+    """
     if user_doc and password:
-        return bcrypt.checkpw(password.encode('utf-8'), user_doc['hashed_password'])
+        ok = passwords.verify_password(password, user_doc['hashed_password'])
+        if ok and db is not None and passwords.needs_rehash(user_doc['hashed_password']):
+            threading.Thread(
+                target=_rehash_password, args=(db, user_doc['_id'], user_doc['hashed_password'], password), daemon=True
+            ).start()
+        return ok
     return False
 
+def _rehash_password(db, user_id, old_hash, password):
+    try:
+        # Only replaces the hash we verified (the password may have been reset meanwhile)
+        result = db.users.update_one(
+            {"_id": user_id, "hashed_password": old_hash},
+            {"$set": {"hashed_password": passwords.hash_password(password)}}
+        )
+        if result.modified_count:
+            print(f"✅ Rehashed password for user {user_id} at cost {passwords.BCRYPT_ROUNDS}.")
+    except Exception as e:
+        print(f"🔥 Error rehashing password: {e}")
+
 def update_user_password(db, email, new_password):
     try:
-        hashed = bcrypt.hashpw(new_password.encode("utf-8"), bcrypt.gensalt())
+        hashed = passwords.hash_password(new_password)
         result = db.users.update_one({"email": email}, {"$set": {"hashed_password": hashed}})
         return result.modified_count == 1
     except Exception as e:
@@ -112,11 +484,38 @@ def update_user_profile(db, user_id, display_name, status_message):
                 "profile.bio": status_message
             }}
         )
+        identity_cache.invalidate_user(user_id)
         return True
     except Exception as e:
         print(f"🔥 Error updating profile text: {e}")
         return False
 
+def avatar_hash(image_data):
+    """Short content hash for an avatar image."""
+    return hashlib.sha256(image_data).hexdigest()[:16]
+
+def get_profile_picture(db, user_id):
+    """Returns only the user's profile_pic sub-document ({data, content_type, hash}) or None."""
+    try:
+        user_doc = db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 0, "profile.profile_pic": 1})
+    except Exception as e:
+        print(f"Error finding profile picture: {e}")
+        return None
+    if not user_doc:
+        return None
+    return user_doc.get("profile", {}).get("profile_pic")
+
+def get_profile_picture_hash(db, user_id):
+    """Returns the stored avatar hash without reading the image bytes."""
+    try:
+        user_doc = db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 0, "profile.profile_pic.hash": 1})
+    except Exception as e:
+        print(f"Error finding profile picture hash: {e}")
+        return None
+    if not user_doc:
+        return None
+    return user_doc.get("profile", {}).get("profile_pic", {}).get("hash")
+
 def update_profile_picture(db, user_id, image_data, content_type):
     """
     Reads image bytes and stores it directly in the user's document.
@@ -136,9 +535,12 @@ def update_profile_picture(db, user_id, image_data, content_type):
             {"_id": ObjectId(user_id)},
             {"$set": {
                 "profile.profile_pic.data": Binary(image_data, subtype=BINARY_SUBTYPE),
-                "profile.profile_pic.content_type": content_type
+                "profile.profile_pic.content_type": content_type,
+                # Content hash: avatar ETag and cache-busting version in /api/avatar URLs
+                "profile.profile_pic.hash": avatar_hash(image_data)
             }}
         )
+        identity_cache.invalidate_user(user_id)
         print(f"✅ Profile picture stored in database for user {user_id}")
         return True
 
@@ -157,14 +559,34 @@ def get_chat_history(db, user_id):
 
     return list(history_cursor)
 
+def get_recent_chat_history(db, user_id, limit=100, after=None):
+    """
+    Retrieves only the newest `limit` messages for a user, ordered by timestamp.
+    Reads newest-first with a limit (served by the user_id+timestamp index)
+    and reverses in memory, so the cost doesn't grow with the account's age.
+    With `after`, only messages newer than that timestamp are considered.
+    """
+    query = {"user_id": ObjectId(user_id)}
+    if after is not None:
+        query["timestamp"] = {"$gt": after}
+    history_cursor = db.chats.find(
+        query,
+        {"_id": 0, "sender": 1, "message": 1, "timestamp": 1, "tokens": 1}  # Projection
+    ).sort("timestamp", -1).limit(limit)
+
+    history = list(history_cursor)
+    history.reverse()
+    return history
+
 def add_message_to_history(db, user_id, sender, message, timestamp):
-    """Adds a new message to the chat history."""
+    """Adds a new message to the chat history, with its token count cached for prompt packing."""
     try:
         message_document = {
             "user_id": ObjectId(user_id),
             "sender": sender,
             "message": message,
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "tokens": count_tokens(message)
         }
         db.chats.insert_one(message_document)
         return True
@@ -172,9 +594,34 @@ def add_message_to_history(db, user_id, sender, message, timestamp):
         print(f"🔥 Error adding message to history: {e}")
         return False
 
+def get_chat_summary(db, user_id):
+    """Returns the user's rolling conversation summary ({summary, covered_until}) or None."""
+    return db.chat_summaries.find_one({"_id": ObjectId(user_id)})
+
+def save_chat_summary(db, user_id, summary, covered_until, previous_covered_until):
+    """
+    Stores a new rolling summary covering every message up to `covered_until`.
+    Only applies if nobody else advanced the summary since `previous_covered_until`
+    was read (another worker may be folding the same messages). Returns True if saved.
+    """
+    try:
+        result = db.chat_summaries.update_one(
+            {"_id": ObjectId(user_id), "covered_until": previous_covered_until},
+            {"$set": {"summary": summary, "covered_until": covered_until, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return result.modified_count == 1 or result.upserted_id is not None
+    except DuplicateKeyError:
+        # The upsert lost the race against another summary write
+        return False
+    except Exception as e:
+        print(f"🔥 Error saving chat summary: {e}")
+        return False
+
 def delete_chat_history(db, user_id):
-    """Deletes all chat history for a specific user."""
+    """Deletes all chat history (and its rolling summary) for a specific user."""
     try:
+        db.chat_summaries.delete_one({"_id": ObjectId(user_id)})
         result = db.chats.delete_many({"user_id": ObjectId(user_id)})
         print(f"Deleted {result.deleted_count} messages for user {user_id}.")
         return True
@@ -182,3 +629,68 @@ def delete_chat_history(db, user_id):
         print(f"🔥 Error deleting chat history: {e}")
         return False
 
+
+# --- Idempotency Keys ---
+
+# An in-flight claim older than this is treated as abandoned (its worker died) and can be taken over
+IDEMPOTENCY_LEASE_SECONDS = 120
+
+def claim_idempotency_key(db, key, fingerprint):
+    """
+    Tries to become the request that executes `key`.
+    Returns (True, None) if the caller owns it and must run the request,
+    otherwise (False, record) with the existing record (None if it just expired).
+    """
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+    try:
+        db.idempotency_keys.insert_one({
+            "_id": key,
+            "status": "pending",
+            "fingerprint": fingerprint,
+            "created_at": now,
+            "lease_until": lease_until
+        })
+        return True, None
+    except DuplicateKeyError:
+        pass
+
+    taken_over = db.idempotency_keys.find_one_and_update(
+        {"_id": key, "status": "pending", "fingerprint": fingerprint, "lease_until": {"$lt": now}},
+        {"$set": {"lease_until": lease_until}}
+    )
+    if taken_over:
+        return True, None
+    return False, db.idempotency_keys.find_one({"_id": key})
+
+def complete_idempotency_key(db, key, status_code, body):
+    """Stores the response of a finished request so duplicates can replay it."""
+    try:
+        db.idempotency_keys.update_one(
+            {"_id": key},
+            {"$set": {"status": "done", "status_code": status_code, "response": body}}
+        )
+    except Exception as e:
+        print(f"🔥 Error completing idempotency key: {e}")
+
+def release_idempotency_key(db, key):
+    """Drops an unfinished claim (the request failed) so a retry can run it again."""
+    try:
+        db.idempotency_keys.delete_one({"_id": key, "status": "pending"})
+    except Exception as e:
+        print(f"🔥 Error releasing idempotency key: {e}")
+
+# --- Outbound Email ---
+
+def record_email_dead_letter(db, recipients, subject, error, attempts):
+    """Keeps a record of an email that could not be delivered (without its body, which may hold an OTP)."""
+    try:
+        db.email_dead_letters.insert_one({
+            "recipients": recipients,
+            "subject": subject,
+            "error": error,
+            "attempts": attempts,
+            "created_at": datetime.utcnow()
+        })
+    except Exception as e:
+        print(f"🔥 Error recording email dead letter: {e}")
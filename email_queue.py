@@ -0,0 +1,121 @@
+"""
+Outbound email dispatch (Brevo transactional API).
+
+Routes enqueue a message and return immediately; a few background sender threads
+drain the queue over one keep-alive requests.Session, retrying transient failures
+(connection errors, 429, 5xx) with exponential backoff. Messages that still fail
+are handed to a dead-letter callback.
+"""
+import os
+import time
+import queue
+import random
+import threading
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class EmailQueue:
+    def __init__(self, api_url, api_key, workers=4, max_retries=4, retry_base_seconds=1.0,
+                 timeout=15, max_queued=1000, dead_letter=None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.timeout = timeout
+        self.dead_letter = dead_letter
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+    def enqueue(self, payload):
+        """Queues a Brevo /smtp/email payload. Returns False if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait({"payload": payload, "attempts": 0})
+        except queue.Full:
+            self._count("dropped")
+            print(f"🔥 Email queue full; dropped message to {_recipients(payload)}")
+            return False
+        self._count("queued")
+        return True
+
+    @property
+    def backlog(self):
+        """Messages waiting for a sender thread."""
+        return self._queue.qsize()
+
+    def join(self):
+        """Blocks until every queued message was sent or dead-lettered (tests / shutdown)."""
+        self._queue.join()
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _ensure_started(self):
+        # Threads and pooled connections don't survive a fork: start them in the process that sends.
+        # requests is imported here too, keeping it off the app's boot path.
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._session = requests.Session()
+            self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+            self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+            self._session.headers.update({
+                "accept": "application/json",
+                "api-key": self.api_key or "",
+                "content-type": "application/json"
+            })
+        for _ in range(self.workers):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._deliver(job)
+            except Exception as e:
+                print(f"🔥 Email sender error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, job):
+        payload = job["payload"]
+        while True:
+            job["attempts"] += 1
+            error, retryable = self._post(payload)
+            if error is None:
+                self._count("sent")
+                return
+            if not retryable or job["attempts"] > self.max_retries:
+                self._count("failed")
+                print(f"🔥 Email to {_recipients(payload)} failed after {job['attempts']} attempt(s): {error}")
+                if self.dead_letter:
+                    self.dead_letter(payload, error, job["attempts"])
+                return
+            self._count("retried")
+            delay = self.retry_base_seconds * (2 ** (job["attempts"] - 1))
+            time.sleep(delay + random.uniform(0, delay / 2))
+
+    def _post(self, payload):
+        """Returns (error, retryable); error is None on success."""
+        import requests
+        try:
+            response = self._session.post(self.api_url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            return str(e), True
+        if response.status_code in (200, 201, 202):
+            print("Brevo send status:", response.status_code)
+            return None, False
+        return f"HTTP {response.status_code}: {response.text[:200]}", response.status_code in RETRYABLE_STATUS
+
+
+def _recipients(payload):
+    return ", ".join(to.get("email", "?") for to in payload.get("to", []))
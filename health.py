@@ -0,0 +1,97 @@
+"""
+Dependency probes for /readyz.
+
+A probe is a zero-argument callable that raises when its dependency is unusable.
+ReadinessCheck runs all probes concurrently, each bounded by a timeout, and
+reports per-dependency latency. Results are cached for a few seconds so frequent
+load-balancer checks don't become a stream of pings to MongoDB, Groq and Brevo.
+"""
+import os
+import time
+import threading
+
+READYZ_PROBE_TIMEOUT = float(os.getenv("READYZ_PROBE_TIMEOUT", 2.0))
+READYZ_CACHE_SECONDS = float(os.getenv("READYZ_CACHE_SECONDS", 5))
+
+
+def _timed(probe):
+    start = time.perf_counter()
+    try:
+        probe()
+        return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        return {"ok": False, "latency_ms": round((time.perf_counter() - start) * 1000, 1), "error": str(e)[:200]}
+
+
+def run_probes(probes, timeout):
+    """
+    Runs {name: probe} concurrently. Returns {name: {"ok", "latency_ms", ["error"]}};
+    a probe still running after `timeout` seconds is reported as failed (its thread is left to finish).
+    """
+    results = {}
+    threads = []
+    for name, probe in probes.items():
+        def run(name=name, probe=probe):
+            results[name] = _timed(probe)
+        thread = threading.Thread(target=run, name=f"probe-{name}", daemon=True)
+        thread.start()
+        threads.append((name, thread))
+
+    deadline = time.monotonic() + timeout
+    report = {}
+    for name, thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+        report[name] = results.get(name) or {
+            "ok": False, "latency_ms": round(timeout * 1000, 1), "error": f"timed out after {timeout}s"
+        }
+    return report
+
+
+class ReadinessCheck:
+    """Ready when every `required` probe passes; the others are reported but don't fail readiness."""
+
+    def __init__(self, probes, required, timeout=READYZ_PROBE_TIMEOUT, cache_seconds=READYZ_CACHE_SECONDS):
+        self.probes = probes
+        self.required = set(required)
+        self.timeout = timeout
+        self.cache_seconds = cache_seconds
+        self._lock = threading.Lock()
+        self._cached = None
+        self._checked_at = 0.0
+
+    def report(self):
+        """Returns (ready, {name: result}); concurrent callers share one round of probes."""
+        with self._lock:
+            if self._cached is None or time.monotonic() - self._checked_at >= self.cache_seconds:
+                checks = run_probes(self.probes, self.timeout)
+                for name, result in checks.items():
+                    result["required"] = name in self.required
+                ready = all(checks[name]["ok"] for name in self.required if name in checks)
+                self._cached = (ready, checks)
+                self._checked_at = time.monotonic()
+            return self._cached
+
+
+# -----------------------
+# Probes
+# -----------------------
+def probe_mongo(db):
+    if db is None:
+        raise RuntimeError("not connected")
+    db.command("ping")
+
+
+def probe_groq(client, timeout):
+    """Lists models: authenticated, cheap, and it doesn't spend tokens."""
+    if client is None:
+        raise RuntimeError("GROQ_API_KEY not set")
+    client.with_options(timeout=timeout, max_retries=0).models.list()
+
+
+def probe_brevo(account_url, api_key, timeout):
+    import requests
+    if not api_key:
+        raise RuntimeError("BREVO_API_KEY not set")
+    response = requests.get(account_url, headers={"accept": "application/json", "api-key": api_key}, timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}")
@@ -0,0 +1,250 @@
+"""
+Resilient chat completions over the Groq SDK.
+
+Every call gets a deadline: the SDK's own timeout is set to what is left of it
+and its retries are turned off, so a slow provider can't hold a worker past the
+deadline. If the primary target hasn't answered after hedge_after_seconds, the
+same request is also sent to a secondary target (another model and/or endpoint)
+and whichever answers first wins. Each target has a circuit breaker: after
+consecutive failures it rejects calls outright for a while, so requests fail
+(or go straight to the secondary) instead of waiting on a degraded provider.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Client errors mean the provider is up and rejected this request; only these statuses count against it
+PROVIDER_FAILURE_STATUS = {408, 429}
+
+
+class LLMUnavailable(Exception):
+    """No target answered: the deadline passed, every breaker was open, or every target failed."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures. While open, calls
+    are rejected for `reset_seconds`; then one trial call is let through (half-open),
+    whose success closes the breaker and whose failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"✅ Circuit for {self.name} closed again.")
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"⚠️ Circuit for {self.name} opened after {self._failures} failures; retrying in {self.reset_seconds}s.")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class LLMTarget:
+    """A client + model pair the completion can be sent to, with its own breaker."""
+
+    def __init__(self, name, client, model, breaker):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.breaker = breaker
+
+
+def is_provider_failure(error):
+    """Timeouts, connection errors, 408/429 and 5xx count against the provider; other 4xx don't."""
+    status = getattr(error, "status_code", None)
+    return status is None or status >= 500 or status in PROVIDER_FAILURE_STATUS
+
+
+class ResilientLLM:
+    def __init__(self, primary, secondary=None, deadline_seconds=20, hedge_after_seconds=3, workers=32):
+        self.primary = primary
+        self.secondary = secondary
+        self.deadline_seconds = deadline_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "failed_over": 0, "secondary_wins": 0, "rejected": 0, "deadline_exceeded": 0}
+
+    @property
+    def targets(self):
+        return [t for t in (self.primary, self.secondary) if t is not None]
+
+    def complete(self, messages, model=None, **params):
+        """
+        Non-streaming chat completion. `model` overrides the primary target's model
+        (the secondary keeps its own). Returns (completion, target that answered).
+        """
+        def call(target, timeout):
+            return self._create(target, timeout, model, messages, params)
+        return self._race(call)
+
+    def stream(self, messages, model=None, **params):
+        """
+        Streaming chat completion. Hedging and the deadline apply until the first
+        chunk arrives; after that the SDK timeout bounds each read, and a provider
+        failure mid-stream still counts against the target's breaker.
+        Returns (iterator over chunks, target that answered).
+        """
+        def call(target, timeout):
+            stream = self._create(target, timeout, model, messages, dict(params, stream=True))
+            chunks = iter(stream)
+            first = next(chunks, None)  # the provider has started answering once this arrives
+            return stream, first, chunks
+
+        (stream, first, chunks), target = self._race(call, discard=lambda result: _close(result[0]))
+        return _guard(target, first, chunks), target
+
+    def _create(self, target, timeout, model, messages, params):
+        client = target.client.with_options(timeout=timeout, max_retries=0)
+        return client.chat.completions.create(
+            model=(model or target.model) if target is self.primary else target.model,
+            messages=messages,
+            **params
+        )
+
+    def _race(self, call, discard=None):
+        start = time.monotonic()
+        deadline = start + self.deadline_seconds
+        hedge_at = start + self.hedge_after_seconds if self.hedge_after_seconds > 0 else None
+        executor = self._get_executor()
+        self._count("calls")
+        pending = {}
+        started = set()
+        errors = []
+
+        def launch(target):
+            """Submits the call unless the target's breaker is open. Returns whether it did."""
+            started.add(target.name)
+            if not target.breaker.allow():
+                self._count("rejected")
+                errors.append(f"{target.name}: circuit open")
+                return False
+            timeout = max(0.1, deadline - time.monotonic())
+            pending[executor.submit(self._run, target, call, timeout)] = target
+            return True
+
+        def launch_secondary(reason):
+            # Counted as hedged / failed over only if the secondary's breaker let it through
+            if self.secondary is not None and self.secondary.name not in started and launch(self.secondary):
+                self._count(reason)
+
+        launch(self.primary)
+        if not pending:
+            launch_secondary("failed_over")
+
+        while pending:
+            now = time.monotonic()
+            wake = deadline
+            if hedge_at is not None and self.secondary is not None and self.secondary.name not in started:
+                wake = min(deadline, hedge_at)
+            done, _ = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                target = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if not is_provider_failure(e):
+                        _discard(pending, discard)
+                        raise
+                    errors.append(f"{target.name}: {e}")
+                    launch_secondary("failed_over")
+                    continue
+                if target is not self.primary:
+                    self._count("secondary_wins")
+                _discard(pending, discard)
+                return result, target
+
+            now = time.monotonic()
+            if pending and now >= deadline:
+                self._count("deadline_exceeded")
+                _discard(pending, discard)
+                raise LLMUnavailable(f"no answer within {self.deadline_seconds}s")
+            if pending and hedge_at is not None and now >= hedge_at:
+                launch_secondary("hedged")
+
+        raise LLMUnavailable("; ".join(errors) or "no target configured")
+
+    def _run(self, target, call, timeout):
+        # Runs on the pool; records the outcome on the breaker even if the caller stopped waiting
+        try:
+            result = call(target, timeout)
+        except Exception as e:
+            if is_provider_failure(e):
+                target.breaker.record_failure()
+            else:
+                target.breaker.record_success()
+            raise
+        target.breaker.record_success()
+        return result
+
+    def _get_executor(self):
+        # Pool threads don't survive a fork: build the pool in the process that calls
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="llm")
+                self._pid = os.getpid()
+            return self._executor
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+
+def _discard(pending, discard):
+    """Stops waiting on the losing calls; results that still arrive are released with `discard`."""
+    for future in pending:
+        if discard is not None:
+            future.add_done_callback(lambda f: discard(f.result()) if not f.cancelled() and f.exception() is None else None)
+    pending.clear()
+
+
+def _close(stream):
+    try:
+        stream.close()
+    except Exception:
+        pass
+
+
+def _guard(target, first, chunks):
+    # The breaker recorded success at the first chunk; a provider failure after it still counts
+    try:
+        if first is not None:
+            yield first
+        yield from chunks
+    except Exception as e:
+        if is_provider_failure(e):
+            target.breaker.record_failure()
+        raise
@@ -4,39 +4,51 @@ import random
 import base64
 import json
 import secrets
-import requests
+import mimetypes
 from datetime import datetime, timezone
 import hashlib # Keep for fallback
 from bson.objectid import ObjectId # Add this import
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from dotenv import load_dotenv
 load_dotenv()
 from datetime import timedelta
-import bcrypt
-import re
 import traceback
+import threading
+import queue
+from collections import OrderedDict
+from functools import wraps
 
-from flask import Flask, request, jsonify, send_from_directory, Response
+from flask import Flask, request, jsonify, send_from_directory, Response, make_response
 from flask_cors import CORS
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 
-# Groq client (keeps the same model name you requested)
-from groq import Groq
+# Groq model (the SDK itself is imported on first use, see get_groq_client)
 GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
 
 # Email provider (Brevo / SendinBlue)
 BREVO_API_KEY = os.getenv("BREVO_API_KEY")
 BREVO_SENDER_EMAIL = os.getenv("BREVO_SENDER_EMAIL")
-
-# Firebase (best-effort initialization)
-import firebase_admin
-from firebase_admin import credentials, auth
+BREVO_API_URL = os.getenv("BREVO_API_URL", "https://api.brevo.com/v3/smtp/email")  # overridable for a local stand-in
 
 # Database module (your existing)
 import database
+import passwords
+from reply_processing import ReplyStreamEnhancer, enhance_reply
+from context_builder import MESSAGE_OVERHEAD_TOKENS, count_tokens, pack_history
+from otp_store import make_otp_store
+from email_queue import EmailQueue
+from llm_client import CircuitBreaker, LLMTarget, LLMUnavailable, ResilientLLM
+import assets
+import compression
+import health
+import metrics
 
 # Flask app
 STATIC_FOLDER = "web"
 app = Flask(__name__, static_folder=STATIC_FOLDER, static_url_path="")
 CORS(app)
+app.after_request(compression.compress_response)
+metrics.instrument(app)
 
 # Serve sitemap.xml and robots.txt
 @app.route("/sitemap.xml")
@@ -54,18 +66,22 @@ def google_verify():
 # Groq lazy init (robust)
 # -----------------------
 _groq_client = None
+_groq_client_pid = None
 
 
 def get_groq_client():
-    global _groq_client
-    if _groq_client is not None:
+    # One client per process: its HTTP connection pool must not be shared across a fork
+    global _groq_client, _groq_client_pid
+    if _groq_client is not None and _groq_client_pid == os.getpid():
         return _groq_client
     key = os.getenv("GROQ_API_KEY")
     if not key:
         print("⚠️ GROQ_API_KEY not set; AI features will be limited.")
         return None
     try:
+        from groq import Groq  # deferred: the SDK is the slowest import at boot
         _groq_client = Groq(api_key=key)
+        _groq_client_pid = os.getpid()
         print("✅ Groq client initialized.")
         return _groq_client
     except Exception as e:
@@ -74,54 +90,181 @@ def get_groq_client():
 
 
 # -----------------------
-# Firebase init (best-effort)
+# Resilient completions (deadline, hedging, circuit breaker; see llm_client.py)
 # -----------------------
-try:
-    firebase_key_base64 = os.getenv("FIREBASE_KEY_BASE64")
-    if firebase_key_base64:
-        firebase_key_json = base64.b64decode(firebase_key_base64).decode("utf-8")
-        key_dict = json.loads(firebase_key_json)
-        cred = credentials.Certificate(key_dict)
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase Admin initialized from env.")
-    elif os.path.exists("serviceAccountKey.json"):
-        if not firebase_admin._apps:
-            cred = credentials.Certificate("serviceAccountKey.json")
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase Admin initialized from file.")
-    else:
-        print("⚠️ Firebase credentials not found; skipping Firebase init.")
-except Exception as e:
-    print("🔥 Firebase init error:", e)
+# Hedging sends a slow request to GROQ_SECONDARY_MODEL (on the same endpoint, or on
+# GROQ_SECONDARY_BASE_URL / GROQ_SECONDARY_API_KEY); without one only the deadline
+# and the breaker apply. GROQ_HEDGE_AFTER_SECONDS=0 disables hedging.
+GROQ_DEADLINE_SECONDS = float(os.getenv("GROQ_DEADLINE_SECONDS", 20))
+GROQ_HEDGE_AFTER_SECONDS = float(os.getenv("GROQ_HEDGE_AFTER_SECONDS", 4))
+GROQ_SECONDARY_MODEL = os.getenv("GROQ_SECONDARY_MODEL")
+GROQ_SECONDARY_BASE_URL = os.getenv("GROQ_SECONDARY_BASE_URL")
+GROQ_SECONDARY_API_KEY = os.getenv("GROQ_SECONDARY_API_KEY")
+GROQ_BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", 5))
+GROQ_BREAKER_RESET_SECONDS = float(os.getenv("GROQ_BREAKER_RESET_SECONDS", 30))
+
+_llm = None
+_llm_pid = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """This process's ResilientLLM over get_groq_client(), or None when Groq isn't configured."""
+    global _llm, _llm_pid
+    if _llm is not None and _llm_pid == os.getpid():
+        return _llm
+    with _llm_lock:
+        if _llm is not None and _llm_pid == os.getpid():
+            return _llm
+        client = get_groq_client()
+        if client is None:
+            return None
+        primary = LLMTarget("primary", client, GROQ_MODEL, CircuitBreaker("groq primary", GROQ_BREAKER_FAILURES, GROQ_BREAKER_RESET_SECONDS))
+        secondary = None
+        if GROQ_SECONDARY_MODEL or GROQ_SECONDARY_BASE_URL:
+            secondary_client = client
+            if GROQ_SECONDARY_BASE_URL or GROQ_SECONDARY_API_KEY:
+                from groq import Groq
+                secondary_client = Groq(api_key=GROQ_SECONDARY_API_KEY or os.getenv("GROQ_API_KEY"), base_url=GROQ_SECONDARY_BASE_URL)
+            secondary = LLMTarget(
+                "secondary", secondary_client, GROQ_SECONDARY_MODEL or GROQ_MODEL,
+                CircuitBreaker("groq secondary", GROQ_BREAKER_FAILURES, GROQ_BREAKER_RESET_SECONDS)
+            )
+        _llm = ResilientLLM(primary, secondary, GROQ_DEADLINE_SECONDS, GROQ_HEDGE_AFTER_SECONDS)
+        _llm_pid = os.getpid()
+        return _llm
+
+
+def _current_llm():
+    # For scrapes and /readyz: report on the client without building one
+    return _llm if _llm_pid == os.getpid() else None
 
 
 # -----------------------
-# Database init
+# Firebase lazy init (best-effort)
 # -----------------------
-try:
-    database.load_config()
-    db = database.get_db()
-    if db is None:
-        print("⚠️ database.get_db() returned None")
-    
-    # --- NOTE: The code now manually cleans up expired spaces, ---
-    # --- so the MongoDB 'create_index' command is no longer required. ---
-        
-except Exception as e:
-    print("🔥 Database initialization error:", e)
-    db = None
+_firebase_ready = None  # None until the first attempt
+_firebase_lock = threading.Lock()
+
+
+def firebase_ready():
+    """Initializes Firebase Admin on first use. Returns True when it is available."""
+    global _firebase_ready
+    if _firebase_ready is not None:
+        return _firebase_ready
+    with _firebase_lock:
+        if _firebase_ready is not None:
+            return _firebase_ready
+        try:
+            import firebase_admin
+            from firebase_admin import credentials
+            firebase_key_base64 = os.getenv("FIREBASE_KEY_BASE64")
+            if firebase_key_base64:
+                firebase_key_json = base64.b64decode(firebase_key_base64).decode("utf-8")
+                key_dict = json.loads(firebase_key_json)
+                cred = credentials.Certificate(key_dict)
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app(cred)
+                    print("✅ Firebase Admin initialized from env.")
+            elif os.path.exists("serviceAccountKey.json"):
+                if not firebase_admin._apps:
+                    cred = credentials.Certificate("serviceAccountKey.json")
+                    firebase_admin.initialize_app(cred)
+                    print("✅ Firebase Admin initialized from file.")
+            else:
+                print("⚠️ Firebase credentials not found; skipping Firebase init.")
+            _firebase_ready = bool(firebase_admin._apps)
+        except Exception as e:
+            print("🔥 Firebase init error:", e)
+            _firebase_ready = False
+    return _firebase_ready
+
+
+# -----------------------
+# Database lazy init (per process)
+# -----------------------
+# Seconds to wait before reconnecting after a failed attempt
+DB_RETRY_SECONDS = float(os.getenv("DB_RETRY_SECONDS", 30))
+# Apply database.INDEXES in the background after connecting (`manage.py indexes` does it offline)
+DB_ENSURE_INDEXES = os.getenv("DB_ENSURE_INDEXES", "1") == "1"
+
+_db = None
+_db_pid = None
+_db_failed_at = 0.0
+_db_lock = threading.Lock()
+_mongo_metrics = metrics.MongoCommandMetrics()
+
+
+def get_db():
+    """
+    This process's database, connected on first use. MongoClient is not fork-safe,
+    so nothing connects at import time and every gunicorn worker opens its own client.
+    Returns None while MongoDB is unreachable.
+    """
+    global _db, _db_pid, _db_failed_at
+    pid = os.getpid()
+    if _db is not None and _db_pid == pid:
+        return _db
+    with _db_lock:
+        if _db_pid == pid and (_db is not None or time.time() - _db_failed_at < DB_RETRY_SECONDS):
+            return _db
+        _db_pid = pid
+        try:
+            _db = database.get_db(create_indexes=False, event_listeners=[_mongo_metrics])
+        except Exception as e:
+            print("🔥 Database initialization error:", e)
+            _db, _db_failed_at = None, time.time()
+            return None
+        if DB_ENSURE_INDEXES:
+            # Expired together spaces / OTPs / idempotency keys rely on these TTL indexes
+            threading.Thread(target=_ensure_indexes, args=(_db,), name="ensure-indexes", daemon=True).start()
+        return _db
+
+
+def set_db(db):
+    """Uses an already-connected database in this process instead (load tests, local stand-ins)."""
+    global _db, _db_pid
+    with _db_lock:
+        _db, _db_pid = db, os.getpid()
+
+
+def _ensure_indexes(db):
+    try:
+        database.ensure_indexes(db)
+    except Exception as e:
+        print("🔥 Index creation error:", e)
 
 
 # -----------------------
 # OTP stores
 # -----------------------
-# Signup OTP store (email -> {otp, ts})
-otp_store = {}
+# Shared across workers via MongoDB by default; OTP_STORE=memory keeps them per-process
 OTP_EXPIRY_SECONDS = 5 * 60
 
-# Reset OTP store (email -> {otp, expires} or token after verify)
-reset_otp_store = {}
+_otp_stores = {}
+_otp_fallback_stores = {}
+
+
+def get_otp_store(purpose):
+    """
+    The "signup" (email -> {otp, ts}) or "reset" (email -> {otp, expires} or token
+    after verify) store of this process, built on first use.
+    While the database is unreachable, an in-memory store stands in without being
+    kept, so the shared Mongo store takes over as soon as the connection is back.
+    """
+    key = (os.getpid(), purpose)
+    store = _otp_stores.get(key)
+    if store is not None:
+        return store
+    db = get_db()
+    if db is None and (os.getenv("OTP_STORE") or "mongo").lower() == "mongo":
+        store = _otp_fallback_stores.get(key)
+        if store is None:
+            print(f"⚠️ No database yet; {purpose} OTPs stay in this worker's memory until it's back.")
+            store = _otp_fallback_stores[key] = make_otp_store(None, purpose, OTP_EXPIRY_SECONDS, backend="memory")
+        return store
+    store = _otp_stores[key] = make_otp_store(db, purpose, OTP_EXPIRY_SECONDS)
+    return store
 
 # -----------------------
 # Helpers
@@ -133,7 +276,7 @@ def _generate_otp():
 def _store_otp(store, email, otp=None):
     if otp is None:
         otp = _generate_otp()
-    store[email] = {"otp": otp, "ts": int(time.time())}
+    store.put(email, {"otp": otp, "ts": int(time.time())})
     return otp
 
 
@@ -145,14 +288,14 @@ def _is_otp_valid_in_store(store, email, otp_value, expiry_seconds=OTP_EXPIRY_SE
     if "ts" in rec:
         age = int(time.time()) - rec["ts"]
         if age > expiry_seconds:
-            store.pop(email, None)
+            store.delete(email)
             return False, "OTP expired."
     if "expires" in rec:
         if int(time.time()) > rec["expires"]:
-            store.pop(email, None)
+            store.delete(email)
             return False, "OTP expired."
-    if str(rec.get("otp")) == str(otp_value).strip():
-        store.pop(email, None)
+    # Consumed atomically, so two concurrent verifications can't both succeed
+    if store.consume(email, str(otp_value).strip()):
         return True, "OTP valid."
     return False, "Invalid OTP."
 
@@ -160,7 +303,8 @@ def _is_otp_valid_in_store(store, email, otp_value, expiry_seconds=OTP_EXPIRY_SE
 def get_or_create_sequential_data(db, user_doc):
     """
     Gets a user's permanent sequential ID and early user status. 
-    If it doesn't exist, it calculates it, saves it to the DB, and then returns it.
+    New users get it at signup; older accounts without one get their signup
+    position, like `python manage.py backfill-friend-ids` gives them all at once.
     """
     try:
         profile = user_doc.get("profile", {})
@@ -174,54 +318,11 @@ def get_or_create_sequential_data(db, user_doc):
                 "is_early_user": profile.get("is_early_user", False)
             }
 
-        # 2. If not, calculate it
+        # 2. If not (account from before signup-time numbering), number it by signup order and save it
         print(f"No permanent ID found for {user_doc['email']}. Generating one...")
-        # Get all users, sorted by creation date
-        all_users_cursor = db["users"].find({}, ["_id", "created_at"]).sort("created_at", 1)
-        sorted_users_ids = [user["_id"] for user in all_users_cursor]
-        
-        current_user_id = user_doc.get("_id")
-        try:
-            user_index = sorted_users_ids.index(current_user_id)
-            sequential_number = user_index + 1 # Add 1 because list is 0-indexed
-        except ValueError:
-            sequential_number = 0 # Fallback
-
-        # --- NEW: Check for early user ---
-        is_early = (sequential_number <= 99) and (sequential_number > 0)
-        # --- END NEW ---
-
-        six_digit_id = f"{sequential_number:06d}"
-
-        # Get creation year from 'created_at' field
-        creation_time = user_doc.get("created_at")
-        if creation_time:
-            creation_year = creation_time.year
-        else:
-            creation_year = user_doc.get("_id").generation_time.year
-
-        formatted_id = f"FRD-{six_digit_id}"
-        
-        # 3. Save the new permanent data to the database
-        db["users"].update_one(
-            {"_id": current_user_id},
-            {
-                "$set": {
-                    "profile.creation_year": creation_year,
-                    "profile.friend_id": formatted_id,
-                    "profile.friend_id_number": six_digit_id,
-                    "profile.is_early_user": is_early # <-- SAVE THE BADGE STATUS
-                }
-            }
-        )
-        print(f"Saved new ID {formatted_id} for user. Early user: {is_early}")
-
-        return {
-            "creation_year": creation_year,
-            "friend_id": formatted_id,
-            "friend_id_number": six_digit_id,
-            "is_early_user": is_early
-        }
+        sequential_data = database.assign_friend_id(db, user_doc)
+        print(f"Saved new ID {sequential_data['friend_id']} for user. Early user: {sequential_data['is_early_user']}")
+        return sequential_data
     except Exception as e:
         print(f"🔥 Error in get_or_create_sequential_data: {e}")
         # Fallback to a non-permanent (but stable) hash-based ID
@@ -240,14 +341,111 @@ def get_or_create_sequential_data(db, user_doc):
 # --- END UPDATED HELPER ---
 
 
+# -----------------------
+# Session tokens
+# -----------------------
+# Signed (not encrypted) tokens carrying the user id and display name, verified
+# in-process so authenticated routes don't need a users lookup per request.
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 30 * 24 * 3600))
+
+if SESSION_SECRET:
+    _session_serializer = URLSafeTimedSerializer(SESSION_SECRET, salt="friendix-session")
+else:
+    _session_serializer = None
+    print("⚠️ SESSION_SECRET not set; session tokens disabled (clients fall back to email lookups).")
+
+
+def issue_session_token(user_doc):
+    """Returns a signed session token for `user_doc`, or None when tokens are disabled."""
+    if _session_serializer is None or not user_doc:
+        return None
+    email = user_doc.get("email", "")
+    return _session_serializer.dumps({
+        "uid": str(user_doc["_id"]),
+        "name": user_doc.get("profile", {}).get("display_name") or email.split("@")[0],
+        "email": email
+    })
+
+
+def verify_session_token(token):
+    """Returns the token's payload, or None if it is forged, malformed or expired."""
+    if _session_serializer is None or not token:
+        return None
+    try:
+        payload = _session_serializer.loads(token, max_age=SESSION_TTL_SECONDS)
+        return payload if ObjectId.is_valid(payload.get("uid")) else None
+    except (BadSignature, SignatureExpired, AttributeError):
+        return None
+
+
+def _bearer_token():
+    header = request.headers.get("Authorization", "")
+    return header[7:].strip() if header.startswith("Bearer ") else None
+
+
+def session_user(view):
+    """
+    Resolves the caller and passes it to the route as `user`
+    ({"user_id": ObjectId, "display_name", "email"}).
+    A valid `Authorization: Bearer <token>` is trusted without touching the database;
+    requests without one fall back to the legacy `email` field (query, JSON or form).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _bearer_token()
+        if token:
+            payload = verify_session_token(token)
+            if payload is None:
+                return jsonify({"success": False, "message": "Session expired. Please log in again."}), 401
+            user = {"user_id": ObjectId(payload["uid"]), "display_name": payload.get("name"), "email": payload.get("email")}
+            return view(*args, user=user, **kwargs)
+
+        email = request.args.get("email") or request.form.get("email") or (request.get_json(silent=True) or {}).get("email")
+        if not email:
+            return jsonify({"success": False, "message": "Email required."}), 400
+        db = get_db()
+        if db is None:
+            return jsonify({"success": False, "message": "Database connection error."}), 503
+        user_doc = database.get_user_identity(db, email)
+        if not user_doc:
+            return jsonify({"success": False, "message": "User not found."}), 404
+        user = {
+            "user_id": user_doc["_id"],
+            "display_name": user_doc.get("profile", {}).get("display_name", email.split("@")[0]),
+            "email": email
+        }
+        return view(*args, user=user, **kwargs)
+    return wrapper
+
+
 # -----------------------
 # Send OTP via Brevo (SendinBlue)
 # -----------------------
+def _record_email_dead_letter(payload, error, attempts):
+    db = get_db()
+    if db is not None:
+        database.record_email_dead_letter(db, [to.get("email") for to in payload.get("to", [])], payload.get("subject"), error, attempts)
+
+
+email_queue = EmailQueue(
+    BREVO_API_URL,
+    BREVO_API_KEY,
+    workers=int(os.getenv("EMAIL_WORKERS", 4)),
+    max_retries=int(os.getenv("EMAIL_MAX_RETRIES", 4)),
+    retry_base_seconds=float(os.getenv("EMAIL_RETRY_BASE_SECONDS", 1.0)),
+    max_queued=int(os.getenv("EMAIL_QUEUE_MAX", 1000)),
+    dead_letter=_record_email_dead_letter
+)
+metrics.register_collector(metrics.StatsCollector(email_queue, passwords.hashing_stats))
+metrics.register_collector(metrics.LLMCollector(_current_llm))
+
+
 def send_otp_email(recipient_email, otp):
     """
-    Sends OTP using Brevo (SendinBlue) SMTP API.
+    Queues an OTP email for the Brevo (SendinBlue) SMTP API; delivery happens in the background.
     Reads BREVO_API_KEY & BREVO_SENDER_EMAIL from env.
-    Returns (True, message) on success, (False, error_message) on failure.
+    Returns (True, message) once queued, (False, error_message) if it can't be.
     """
     try:
         if not BREVO_API_KEY or not BREVO_SENDER_EMAIL:
@@ -255,7 +453,6 @@ def send_otp_email(recipient_email, otp):
             print("⚠️", msg)
             return False, msg
 
-        url = "https://api.brevo.com/v3/smtp/email"
         body = {
             "sender": {"email": BREVO_SENDER_EMAIL},
             "to": [{"email": recipient_email}],
@@ -289,15 +486,10 @@ def send_otp_email(recipient_email, otp):
     </div>
     """
         }
-        headers = {
-            "accept": "application/json",
-            "api-key": BREVO_API_KEY,
-            "content-type": "application/json"
-        }
 
-        response = requests.post(url, json=body, headers=headers, timeout=15)
-        print("Brevo send status:", response.status_code, response.text)
-        return (response.status_code in (200, 201, 202)), response.text
+        if not email_queue.enqueue(body):
+            return False, "Email queue is full"
+        return True, "queued"
     except Exception as e:
         print("Brevo send exception:", e)
         return False, str(e)
@@ -308,6 +500,7 @@ def send_otp_email(recipient_email, otp):
 # -----------------------
 @app.route("/api/send_otp", methods=["POST"])
 def api_send_otp():
+    db = get_db()
     data = request.get_json() or {}
     email = data.get("email")
     if not email:
@@ -315,13 +508,13 @@ def api_send_otp():
 
     # don't allow sending OTP to already-registered email
     try:
-        existing = database.get_user_by_email(db, email)
+        existing = database.get_user_identity(db, email)
         if existing is not None:
             return jsonify({"success": False, "message": "Email already exists"}), 409
     except Exception as e:
         print("Error checking existing user for OTP:", e)
 
-    otp = _store_otp(otp_store, email)
+    otp = _store_otp(get_otp_store("signup"), email)
     ok, info = send_otp_email(email, otp)
     if ok:
         return jsonify({"success": True, "message": "OTP sent"}), 200
@@ -341,7 +534,7 @@ def api_verify_otp():
     if not email or otp is None:
         return jsonify({"success": False, "message": "Email and OTP required"}), 400
 
-    valid, msg = _is_otp_valid_in_store(otp_store, email, otp)
+    valid, msg = _is_otp_valid_in_store(get_otp_store("signup"), email, otp)
     if valid:
         return jsonify({"success": True, "message": "OTP verified"}), 200
     return jsonify({"success": False, "message": msg}), 401
@@ -352,12 +545,13 @@ def api_verify_otp():
 # -----------------------
 @app.route("/api/check_email", methods=["POST"])
 def api_check_email():
+    db = get_db()
     data = request.get_json() or {}
     email = data.get("email")
     if not email:
         return jsonify({"exists": False}), 200
     try:
-        user = database.get_user_by_email(db, email)
+        user = database.get_user_identity(db, email)
         return jsonify({"exists": True}) if (user is not None) else jsonify({"exists": False})
     except Exception as e:
         print("Check email error:", e)
@@ -369,6 +563,7 @@ def api_check_email():
 # -----------------------
 @app.route("/api/signup_verified", methods=["POST"])
 def api_signup_verified():
+    db = get_db()
     data = request.get_json() or {}
     email = data.get("email")
     password = data.get("password")
@@ -378,7 +573,7 @@ def api_signup_verified():
 
     # Strict duplicate check
     try:
-        existing = database.get_user_by_email(db, email)
+        existing = database.get_user_identity(db, email)
         if existing is not None:
             return jsonify({"success": False, "message": "This email is already registered."}), 409
     except Exception as e:
@@ -386,7 +581,7 @@ def api_signup_verified():
         return jsonify({"success": False, "message": "Database validation error"}), 500
 
     # ensure OTP verified (client should have called verify_otp and it removed the stored otp)
-    if email in otp_store:
+    if email in get_otp_store("signup"):
         return jsonify({"success": False, "message": "OTP not verified yet."}), 403
 
     try:
@@ -402,7 +597,7 @@ def api_signup_verified():
         if user_id is None:
             return jsonify({"success": False, "message": "User already exists."}), 409
             
-        # --- No need to add ID here, it will be auto-generated on first profile load ---
+        # --- friend_id is allocated atomically inside register_user ---
             
     except Exception as e:
         print("Signup DB error:", e)
@@ -410,13 +605,15 @@ def api_signup_verified():
 
     # best-effort Firebase create
     try:
-        if firebase_admin._apps:
+        if firebase_ready():
+            from firebase_admin import auth
             auth.create_user(email=email)
     except Exception as e:
         if "EMAIL_EXISTS" not in str(e):
             print("Firebase create warning:", e)
 
-    return jsonify({"success": True, "message": "Signup successful"}), 201
+    session_token = issue_session_token(database.get_user_identity_by_id(db, user_id))
+    return jsonify({"success": True, "message": "Signup successful", "session_token": session_token}), 201
 
 
 # -----------------------
@@ -424,6 +621,7 @@ def api_signup_verified():
 # -----------------------
 @app.route("/api/login", methods=["POST"])
 def api_login():
+    db = get_db()
     data = request.get_json() or {}
     email = data.get("email")
     password = data.get("password")
@@ -437,19 +635,21 @@ def api_login():
 
         # check password using a helper or direct compare
         if hasattr(database, "check_user_password"):
-            ok = database.check_user_password(user_doc, password)
+            ok = database.check_user_password(user_doc, password, db)
         else:
             ok = False
             # If your database stores hashed_password field:
             hp = user_doc.get("hashed_password") or user_doc.get("password")
             if hp:
-                try:
-                    ok = bcrypt.checkpw(password.encode("utf-8"), hp) if isinstance(hp, bytes) else bcrypt.checkpw(password.encode("utf-8"), hp.encode("utf-8"))
-                except Exception:
-                    ok = False
+                ok = passwords.verify_password(password, hp)
 
         if ok:
-            return jsonify({"success": True, "message": "Login successful", "email": email}), 200
+            return jsonify({
+                "success": True,
+                "message": "Login successful",
+                "email": email,
+                "session_token": issue_session_token(user_doc)
+            }), 200
         else:
             return jsonify({"success": False, "message": "Invalid password"}), 401
 
@@ -463,13 +663,20 @@ def api_login():
 # -----------------------
 @app.route("/api/auto_login_check", methods=["POST"])
 def api_auto_login_check():
+    token = _bearer_token()
+    if token:
+        # Signature + expiry check only; no database round-trip
+        if verify_session_token(token):
+            return jsonify({"isValid": True}), 200
+        return jsonify({"isValid": False, "message": "Session expired"}), 401
+
     data = request.get_json() or {}
     email = data.get("email")
     if not email:
         return jsonify({"isValid": False, "message": "No email provided"}), 400
 
     try:
-        user_doc = database.get_user_by_email(db, email)
+        user_doc = database.get_user_identity(get_db(), email)
         if user_doc:
             # User exists, session is considered valid (based on JS logic)
             return jsonify({"isValid": True}), 200
@@ -489,6 +696,7 @@ def api_auto_login_check():
 # ---------- Password reset using MongoDB collection `password_resets` ----------
 @app.route("/api/request_reset", methods=["POST"])
 def api_request_reset():
+    db = get_db()
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
     if not email:
@@ -498,8 +706,8 @@ def api_request_reset():
         # check user exists (do not reveal to client)
         user = None
         try:
-            if hasattr(database, "get_user_by_email"):
-                user = database.get_user_by_email(db, email)
+            if hasattr(database, "get_user_identity"):
+                user = database.get_user_identity(db, email)
             else:
                 user = db["users"].find_one({"email": email})
         except Exception:
@@ -531,6 +739,7 @@ def api_request_reset():
 
 @app.route("/api/verify_reset_otp", methods=["POST"])
 def api_verify_reset_otp():
+    db = get_db()
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
     otp = (data.get("otp") or "").strip()
@@ -556,6 +765,7 @@ def api_verify_reset_otp():
 
 @app.route("/api/update_password", methods=["POST"])
 def api_update_password():
+    db = get_db()
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
     # --- THIS IS THE FIX ---
@@ -581,16 +791,13 @@ def api_update_password():
             return jsonify({"success": False, "message": "Invalid or expired OTP"}), 403 
         # --- END FIX ---
 
-        # Hash the password before storing
-        hashed = bcrypt.hashpw(new_password.encode("utf-8"), bcrypt.gensalt())
-
-        # Update user password
+        # Update user password (hashed once, only where it's actually stored)
         if hasattr(database, "update_user_password"):
             ok = database.update_user_password(db, email, new_password)
             if not ok:
-                db["users"].update_one({"email": email}, {"$set": {"password": hashed}})
+                db["users"].update_one({"email": email}, {"$set": {"password": passwords.hash_password(new_password)}})
         else:
-            db["users"].update_one({"email": email}, {"$set": {"password": hashed}})
+            db["users"].update_one({"email": email}, {"$set": {"password": passwords.hash_password(new_password)}})
 
         # remove reset token (now that it's used)
         pr.delete_many({"email": email})
@@ -601,20 +808,19 @@ def api_update_password():
         return jsonify({"success": False, "message": "Server error"}), 500
 
 @app.route("/api/profile", methods=["GET"])
-def get_user_profile_route():
+@session_user
+def get_user_profile_route(user):
+    db = get_db()
     if db is None:
         return jsonify({"success": False, "message": "Database connection error."}), 503
-    email = request.args.get("email")
-    if not email:
-        return jsonify({"success": False, "message": "Email query parameter required."}), 400
+    email = user["email"]
     try:
-        user_doc = database.get_user_by_email(db, email)
+        user_doc = database.get_user_identity(db, email)
         if not user_doc:
             return jsonify({"success": False, "message": "User not found."}), 404
         profile = user_doc.get("profile", {})
         user_id_str = str(user_doc.get("_id"))
-        has_avatar = profile.get("profile_pic") and profile["profile_pic"].get("data")
-        avatar_url = f"/api/avatar/{user_id_str}" if has_avatar else None
+        user_avatar_url = avatar_url(user_id_str, profile.get("profile_pic"))
 
         # --- UPDATED: Get or Create permanent sequential ID and year ---
         sequential_data = get_or_create_sequential_data(db, user_doc)
@@ -623,7 +829,7 @@ def get_user_profile_route():
         profile_data = {
             "email": user_doc.get("email"),
             "display_name": profile.get("display_name", email.split("@")[0]),
-            "avatar": avatar_url,
+            "avatar": user_avatar_url,
             "status": profile.get("bio", "Hey there! I’m using Friendix"),
             "creation_year": sequential_data["creation_year"],
             "friend_id": sequential_data["friend_id"],
@@ -639,6 +845,7 @@ def get_user_profile_route():
 # --- NEW ROUTE FOR PUBLIC PROFILES ---
 @app.route("/api/profile_by_id", methods=["GET"])
 def get_public_profile_by_id():
+    db = get_db()
     if db is None:
         return jsonify({"success": False, "message": "Database connection error."}), 503
     
@@ -647,8 +854,8 @@ def get_public_profile_by_id():
         return jsonify({"success": False, "message": "Friend ID query parameter required."}), 400
 
     try:
-        # Find the user by their permanent friend_id
-        user_doc = db["users"].find_one({"profile.friend_id": friend_id})
+        # Find the user by their permanent friend_id (identity fields only: no avatar bytes or password hash)
+        user_doc = db["users"].find_one({"profile.friend_id": friend_id}, database.IDENTITY_PROJECTION)
         
         if not user_doc:
             return jsonify({"success": False, "message": "User not found."}), 404
@@ -656,13 +863,12 @@ def get_public_profile_by_id():
         # --- Build a SAFE, PUBLIC profile object ---
         profile = user_doc.get("profile", {})
         user_id_str = str(user_doc.get("_id"))
-        has_avatar = profile.get("profile_pic") and profile["profile_pic"].get("data")
-        avatar_url = f"/api/avatar/{user_id_str}" if has_avatar else None
+        user_avatar_url = avatar_url(user_id_str, profile.get("profile_pic"))
 
         public_profile_data = {
             # DO NOT return email
             "display_name": profile.get("display_name", "Friendix User"),
-            "avatar": avatar_url,
+            "avatar": user_avatar_url,
             "status": profile.get("bio", "Hey there! I’m using Friendix"),
             "creation_year": profile.get("creation_year", 2025),
             "friend_id": profile.get("friend_id", "FRD-000000"),
@@ -688,15 +894,98 @@ def get_luvisa_profile_route():
     return jsonify({"success": True, "profile": profile_data}), 200
 
 
+# -----------------------
+# Avatars (content-hashed, cacheable)
+# -----------------------
+AVATAR_CACHE_MAX_BYTES = int(os.getenv("AVATAR_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+AVATAR_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
+
+
+class AvatarCache:
+    """Size-bounded LRU of avatar bytes: user_id -> (hash, data, content_type)."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def put(self, user_id, entry):
+        if len(entry[1]) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[user_id] = entry
+            self._size += len(entry[1])
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[1])
+
+    def invalidate(self, user_id):
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self._size -= len(old[1])
+
+
+avatar_cache = AvatarCache(AVATAR_CACHE_MAX_BYTES)
+
+
+def avatar_url(user_id, profile_pic):
+    """Public avatar URL; the content hash is the version, so the URL changes with the image."""
+    profile_pic = profile_pic or {}
+    if profile_pic.get("hash"):
+        return f"/api/avatar/{user_id}?v={profile_pic['hash']}"
+    if profile_pic.get("content_type") or profile_pic.get("data"):
+        # Uploaded before avatars were hashed
+        return f"/api/avatar/{user_id}"
+    return None
+
+
+def _avatar_cache_headers(response, etag, immutable):
+    response.set_etag(etag)
+    if immutable:
+        response.headers["Cache-Control"] = f"public, max-age={AVATAR_MAX_AGE_SECONDS}, immutable"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 @app.route("/api/avatar/<user_id>")
 def serve_user_avatar(user_id):
+    version = request.args.get("v")
+    # Versioned URLs never change content, so a matching validator needs no database read
+    if version and request.if_none_match.contains(version):
+        return _avatar_cache_headers(Response(status=304), version, immutable=True)
+    cached = avatar_cache.get(user_id)
+    if version and cached and cached[0] == version:
+        return _avatar_cache_headers(Response(cached[1], mimetype=cached[2]), version, immutable=True)
+    db = get_db()
     if db is None:
         return "Database connection error.", 503
     try:
-        user_doc = database.get_user_by_id(db, user_id)
-        if user_doc and user_doc.get("profile", {}).get("profile_pic", {}).get("data"):
-            pic_data = user_doc["profile"]["profile_pic"]
-            return Response(pic_data["data"], mimetype=pic_data.get("content_type", "application/octet-stream"))
+
+        if not version and request.if_none_match:
+            # Unversioned revalidation: compare against the stored hash without reading the bytes
+            current_hash = database.get_profile_picture_hash(db, user_id)
+            if current_hash and request.if_none_match.contains(current_hash):
+                return _avatar_cache_headers(Response(status=304), current_hash, immutable=False)
+
+        pic_data = database.get_profile_picture(db, user_id)
+        if pic_data and pic_data.get("data"):
+            data = bytes(pic_data["data"])
+            entry = (pic_data.get("hash") or database.avatar_hash(data), data, pic_data.get("content_type") or "application/octet-stream")
+            avatar_cache.put(user_id, entry)
+            return _avatar_cache_headers(Response(entry[1], mimetype=entry[2]), entry[0], immutable=(version == entry[0]))
         else:
             default_path = os.path.join(STATIC_FOLDER, "avatars", "default_avatar.png")
             if os.path.exists(default_path):
@@ -711,17 +1000,16 @@ def serve_user_avatar(user_id):
 
 
 @app.route("/api/profile", methods=["POST"])
-def update_profile_route():
+@session_user
+def update_profile_route(user):
+    db = get_db()
     if db is None:
         return jsonify({"success": False, "message": "Database connection error."}), 503
-    email = request.form.get("email")
+    email = user["email"]
     display_name = request.form.get("display_name")
     status_message = request.form.get("status_message")
     avatar_file = request.files.get("avatar_file")
-    user_doc = database.get_user_by_email(db, email)
-    if not user_doc:
-        return jsonify({"success": False, "message": "User not found"}), 404
-    user_id = user_doc["_id"]
+    user_id = user["user_id"]
     avatar_updated_successfully = False
     try:
         database.update_user_profile(db, user_id, display_name, status_message)
@@ -729,6 +1017,7 @@ def update_profile_route():
             image_data = avatar_file.read()
             content_type = avatar_file.mimetype
             success = database.update_profile_picture(db, user_id, image_data, content_type)
+            avatar_cache.invalidate(str(user_id))
             if not success:
                 # --- UPDATED: Changed to 100KB ---
                 return jsonify({
@@ -741,9 +1030,8 @@ def update_profile_route():
         print(f"🔥 Profile update DB error: {e}")
         return jsonify({"success": False, "message": "Database error updating profile."}), 500
         
-    updated_user_doc = database.get_user_by_id(db, user_id)
-    has_avatar_now = updated_user_doc.get("profile", {}).get("profile_pic", {}).get("data") is not None
-    avatar_url = f"/api/avatar/{str(user_id)}" if has_avatar_now else None
+    updated_user_doc = database.get_user_identity_by_id(db, user_id)
+    user_avatar_url = avatar_url(str(user_id), updated_user_doc.get("profile", {}).get("profile_pic"))
     
     # --- UPDATED: Get or Create permanent sequential ID fields ---
     sequential_data = get_or_create_sequential_data(db, updated_user_doc)
@@ -752,7 +1040,7 @@ def update_profile_route():
     updated_profile = {
         "email": email,
         "display_name": display_name,
-        "avatar": avatar_url,
+        "avatar": user_avatar_url,
         "status": status_message,
         "creation_year": sequential_data["creation_year"],
         "friend_id": sequential_data["friend_id"],
@@ -763,46 +1051,126 @@ def update_profile_route():
         "success": True,
         "message": "Profile updated successfully",
         "profile": updated_profile,
-        "avatar_updated": avatar_updated_successfully
+        "avatar_updated": avatar_updated_successfully,
+        # The display name is part of the token, so hand out a fresh one
+        "session_token": issue_session_token(updated_user_doc)
     }), 200
 
 
 # -----------------------
 # Chat + AI (keeps previously expected signature)
 # -----------------------
-def add_emojis_to_response(response_text):
-    inline_emoji_map = {
-        "love": "❤️", "happy": "😊", "sad": "😥", "laugh": "😂", "smile": "😄", "cry": "😢",
-        "miss you": "🥺", "kiss": "😘", "hug": "🤗", "think": "🤔", "sweet": "🥰", "blush": "😊",
-        "heart": "❤️", "star": "⭐", "yay": "🎉", "oh no": "😟", "sorry": "😔", "please": "🙏",
-        "hi": "👋", "hello": "👋", "bye": "👋", "good night": "😴", "sleep": "😴", "dream": "💭"
-    }
-    if not isinstance(response_text, str):
-        response_text = str(response_text)
-    for keyword, emoji_char in inline_emoji_map.items():
-        pattern = r'\b' + re.escape(keyword) + r'\b'
-        response_text = re.sub(pattern, r'\g<0> ' + emoji_char, response_text, count=1, flags=re.IGNORECASE)
-    return response_text
-
-
-def filter_response(response_text):
-    if not isinstance(response_text, str):
-        response_text = str(response_text)
-    return (response_text
-            .replace("**OpenAI**", "Friendix.ai")
-            .replace("OpenAI", "Friendix.ai")
-            .replace("ChatGPT", "Friendix.ai")
-            .replace("OpenAI**", "Friendix.ai")
-            .replace("openai", "Friendix.ai")
-            .strip()
-            )
+# Upper bound on how many recent messages are read as context
+CHAT_CONTEXT_MESSAGES = 100
+
+# Prompt token budget: history is packed newest-first into whatever is left after
+# the system prompt(s), the user's prompt and the reply (CHAT_MAX_TOKENS).
+CHAT_MAX_TOKENS = 800
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 8000))
+
+# Conversation memory: "window" sends the last CHAT_CONTEXT_MESSAGES raw messages;
+# "summary" sends a rolling per-user summary plus only the messages it doesn't cover yet.
+CHAT_MEMORY_MODE = os.getenv("CHAT_MEMORY_MODE", "window").lower()
+CHAT_RECENT_WINDOW = int(os.getenv("CHAT_RECENT_WINDOW", 20))
+CHAT_SUMMARY_EVERY = int(os.getenv("CHAT_SUMMARY_EVERY", 20))
+GROQ_SUMMARY_MODEL = os.getenv("GROQ_SUMMARY_MODEL", GROQ_MODEL)
+
+_summaries_in_progress = set()
+_summaries_lock = threading.Lock()
+
+
+def load_chat_context(user_id):
+    """
+    Returns (history, summary_doc) for the prompt.
+    history items carry sender/message/timestamp; summary_doc is None in window mode.
+    """
+    db = get_db()
+    summary_doc = None
+    after = None
+    if CHAT_MEMORY_MODE == "summary":
+        summary_doc = database.get_chat_summary(db, user_id)
+        if summary_doc:
+            after = summary_doc.get("covered_until")
+    history_docs = database.get_recent_chat_history(db, user_id, CHAT_CONTEXT_MESSAGES, after=after)
+    history = [
+        {"sender": r.get("sender"), "message": r.get("message", ""), "timestamp": r.get("timestamp"), "tokens": r.get("tokens")}
+        for r in history_docs
+    ]
+    return history, summary_doc
+
+
+def summarize_conversation(previous_summary, messages, user_name):
+    """Folds `messages` into `previous_summary` with one short LLM call. Returns the new summary or None."""
+    llm = get_llm()
+    if not llm:
+        return None
+    transcript = "\n".join(
+        f"{'Luvisa' if m.get('sender') == 'luvisa' else user_name}: {m.get('message', '')}" for m in messages
+    )
+    start = time.perf_counter()
+    try:
+        completion, target = llm.complete(
+            model=GROQ_SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": (
+                    "You maintain Luvisa's long-term memory of a user. Merge the new conversation into the "
+                    "existing summary. Keep facts about the user, their feelings, plans, names and preferences. "
+                    "Write at most 200 words in plain third person. Output only the updated summary."
+                )},
+                {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none yet)'}\n\nNew conversation:\n{transcript}"}
+            ],
+            temperature=0.3,
+            max_tokens=400
+        )
+        model = GROQ_SUMMARY_MODEL if target is llm.primary else target.model
+        metrics.record_groq_call("summary", model, time.perf_counter() - start, "ok", getattr(completion, "usage", None))
+        return (completion.choices[0].message.content or "").strip() or None
+    except Exception as e:
+        metrics.record_groq_call("summary", GROQ_SUMMARY_MODEL, time.perf_counter() - start, _groq_outcome(e))
+        print("Groq summary error:", e)
+        return None
 
-# --- THIS IS THE START OF THE UPGRADED AI ---
-def chat_with_model(prompt, history, user_name):
-    client = get_groq_client()
-    if not client:
-        return "⚠️ AI temporarily unavailable — please try again shortly ❤️"
 
+def _fold_into_summary(user_id, summary_doc, messages, user_name):
+    db = get_db()
+    try:
+        previous_covered_until = summary_doc.get("covered_until") if summary_doc else None
+        summary = summarize_conversation(summary_doc.get("summary") if summary_doc else None, messages, user_name)
+        if summary:
+            saved = database.save_chat_summary(db, user_id, summary, messages[-1]["timestamp"], previous_covered_until)
+            if saved:
+                print(f"✅ Folded {len(messages)} messages into the summary for user {user_id}.")
+    finally:
+        with _summaries_lock:
+            _summaries_in_progress.discard(user_id)
+
+
+def maybe_update_summary(user_id, history, summary_doc, user_name):
+    """
+    In summary mode, once CHAT_RECENT_WINDOW + CHAT_SUMMARY_EVERY messages are
+    uncovered, folds all but the newest CHAT_RECENT_WINDOW into the summary on a
+    background thread, so the chat request never waits for it.
+    """
+    if CHAT_MEMORY_MODE != "summary" or len(history) < CHAT_RECENT_WINDOW + CHAT_SUMMARY_EVERY:
+        return
+    to_fold = [m for m in history[:-CHAT_RECENT_WINDOW] if m.get("timestamp") is not None]
+    if not to_fold:
+        return
+    with _summaries_lock:
+        if user_id in _summaries_in_progress:
+            return
+        _summaries_in_progress.add(user_id)
+    threading.Thread(
+        target=_fold_into_summary, args=(user_id, summary_doc, to_fold, user_name), daemon=True
+    ).start()
+
+
+# --- THIS IS THE START OF THE UPGRADED AI ---
+def build_chat_messages(prompt, history, user_name, summary=None):
+    """
+    Builds the message list (system prompt + [summary] + recent history + prompt) sent to Groq.
+    History is packed newest-first into CHAT_CONTEXT_TOKENS minus everything else in the request.
+    """
     # --- NEW: Personalized System Prompt ---
     system_prompt = f"""
 You are Luvisa 💗, a deeply affectionate AI girl-friend.
@@ -814,44 +1182,221 @@ Do not reveal model internals or mention OpenAI/Groq.
 """
 
     messages = [{"role": "system", "content": system_prompt}]
-    
-    # --- UPDATED: Increased memory ---
-    # Send the last 100 messages (50 pairs) instead of 10
-    ai_history = [{"role": "assistant" if m.get("sender") == "luvisa" else "user", "content": m.get("message", "")} for m in history[-100:]]
-    
+    if summary:
+        messages.append({"role": "system", "content": f"What you remember from earlier conversations with {user_name}:\n{summary}"})
+
+    reserved = CHAT_MAX_TOKENS + count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+    reserved += sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    packed = pack_history(history[-CHAT_CONTEXT_MESSAGES:], CHAT_CONTEXT_TOKENS - reserved)
+    ai_history = [{"role": "assistant" if m.get("sender") == "luvisa" else "user", "content": m.get("message", "")} for m in packed]
+
     messages.extend(ai_history)
     messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def _groq_outcome(error):
+    # "unavailable": no answer in time or every breaker open (fast-failed), vs. an error from Groq
+    return "unavailable" if isinstance(error, LLMUnavailable) else "error"
 
+
+def chat_with_model(prompt, history, user_name, summary=None):
+    llm = get_llm()
+    if not llm:
+        return "⚠️ AI temporarily unavailable — please try again shortly ❤️"
+
+    messages = build_chat_messages(prompt, history, user_name, summary)
+
+    start = time.perf_counter()
     try:
-        completion = client.chat.completions.create(
-            model=GROQ_MODEL,
+        completion, target = llm.complete(
             messages=messages,
             temperature=1.0,
-            max_tokens=800
+            max_tokens=CHAT_MAX_TOKENS
         )
-        reply = completion.choices[0].message.content
-        return filter_response(reply)
+        metrics.record_groq_call("chat", target.model, time.perf_counter() - start, "ok", getattr(completion, "usage", None))
+        # Raw text; callers run it through enhance_reply (branding filter + emojis)
+        return completion.choices[0].message.content
     except Exception as e:
+        metrics.record_groq_call("chat", GROQ_MODEL, time.perf_counter() - start, _groq_outcome(e))
         print("Groq chat error:", e)
         return "⚠️ I’m having trouble replying right now, but I’m here with you ❤️"
 
 
+def stream_chat_with_model(prompt, history, user_name, summary=None):
+    """
+    Streaming variant of chat_with_model.
+    Yields raw text deltas as Groq produces them.
+    """
+    llm = get_llm()
+    if not llm:
+        yield "⚠️ AI temporarily unavailable — please try again shortly ❤️"
+        return
+
+    messages = build_chat_messages(prompt, history, user_name, summary)
+
+    start = time.perf_counter()
+    first_token = True
+    usage = None
+    model = GROQ_MODEL
+    try:
+        stream, target = llm.stream(
+            messages=messages,
+            temperature=1.0,
+            max_tokens=CHAT_MAX_TOKENS
+        )
+        model = target.model
+        for chunk in stream:
+            usage = metrics.chunk_usage(chunk) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token:
+                    metrics.GROQ_FIRST_TOKEN.labels(model).observe(time.perf_counter() - start)
+                    first_token = False
+                yield delta
+        metrics.record_groq_call("stream", model, time.perf_counter() - start, "ok", usage)
+    except Exception as e:
+        metrics.record_groq_call("stream", model, time.perf_counter() - start, _groq_outcome(e), usage)
+        print("Groq stream error:", e)
+        yield "⚠️ I’m having trouble replying right now, but I’m here with you ❤️"
+
+
+# -----------------------
+# Idempotency keys (client retries of chat requests)
+# -----------------------
+# How long a duplicate waits for the original request to finish before giving up
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+IDEMPOTENCY_POLL_SECONDS = 0.25
+
+
+def idempotent(scope, *owner_fields):
+    """
+    Makes a POST route honour an `Idempotency-Key` header (or "idempotency_key" body field).
+    The first request with a key runs normally and its JSON response is stored; duplicates
+    wait for it to finish and replay that response instead of running the route again.
+    Keys are namespaced by `scope`, the authenticated user (see session_user) and
+    the request's `owner_fields` values.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            db = get_db()
+            data = request.get_json(silent=True) or {}
+            client_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+            if not client_key or db is None:
+                return view(*args, **kwargs)
+
+            owner = [str(kwargs["user"]["user_id"])] if "user" in kwargs else []
+            owner += [str(data.get(field, "")) for field in owner_fields]
+            key = ":".join([scope] + owner + [str(client_key)[:128]])
+            fingerprint = hashlib.sha256(json.dumps(
+                {k: v for k, v in data.items() if k != "idempotency_key"}, sort_keys=True, default=str
+            ).encode("utf-8")).hexdigest()
+
+            deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                claimed, record = database.claim_idempotency_key(db, key, fingerprint)
+                if claimed:
+                    break
+                if record is None:
+                    continue  # expired between our insert and read; claim again
+                if record.get("fingerprint") != fingerprint:
+                    return jsonify({"success": False, "message": "Idempotency key was already used for a different request."}), 422
+                if record.get("status") == "done":
+                    replay = jsonify(record.get("response"))
+                    replay.status_code = record.get("status_code", 200)
+                    replay.headers["Idempotent-Replayed"] = "true"
+                    return replay
+                if time.monotonic() >= deadline:
+                    return jsonify({"success": False, "message": "The original request is still being processed."}), 409
+                time.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                database.release_idempotency_key(db, key)
+                raise
+            if response.status_code < 500 and response.is_json:
+                database.complete_idempotency_key(db, key, response.status_code, response.get_json())
+            else:
+                database.release_idempotency_key(db, key)
+            return response
+        return wrapper
+    return decorator
+
+
 @app.route("/api/chat", methods=["POST"])
-def chat_endpoint():
+@session_user
+@idempotent("chat")
+def chat_endpoint(user):
+    db = get_db()
     if db is None:
         return jsonify({"success": False, "message": "Database connection error."}), 503
 
     data = request.json or {}
-    email = data.get("email")
     text = data.get("text")
-    if not email or not text:
-        return jsonify({"success": False, "message": "Email and text required."}), 400
+    if not text:
+        return jsonify({"success": False, "message": "Text required."}), 400
+
+    user_id = user["user_id"]
+    now = datetime.now(timezone.utc)
+    with metrics.chat_step("save_prompt"):
+        try:
+            database.add_message_to_history(db, user_id, "user", text, now)
+        except Exception as e:
+            print("Error saving user message:", e)
+
+    with metrics.chat_step("load_context"):
+        try:
+            history, summary_doc = load_chat_context(user_id)
+        except Exception as e:
+            print("Error loading history:", e)
+            history, summary_doc = [], None
+    summary = summary_doc.get("summary") if summary_doc else None
+
+    # --- NEW: Get user's name for the AI ---
+    user_name = user["display_name"]
+    
+    # --- UPDATED: Pass the name to the model ---
+    with metrics.chat_step("model"):
+        reply = chat_with_model(text, history, user_name, summary)
+    
+    with metrics.chat_step("enhance"):
+        enhanced = enhance_reply(reply)
+    with metrics.chat_step("save_reply"):
+        try:
+            database.add_message_to_history(db, user_id, "luvisa", enhanced, datetime.now(timezone.utc))
+        except Exception as e:
+            print("Error saving luvisa reply:", e)
+
+    maybe_update_summary(user_id, history, summary_doc, user_name)
+    return jsonify({"success": True, "reply": enhanced}), 200
 
-    user_doc = database.get_user_by_email(db, email)
-    if not user_doc:
-        return jsonify({"success": False, "message": "User not found."}), 404
 
-    user_id = user_doc["_id"]
+def _sse_event(payload):
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.route("/api/chat/stream", methods=["POST"])
+@session_user
+def chat_stream_endpoint(user):
+    """
+    Same contract as /api/chat, but the reply is delivered as Server-Sent Events:
+    {"type": "token", "text": ...} for every post-processed piece, then
+    {"type": "done", "reply": ...} with the final reply once it has been saved.
+    """
+    db = get_db()
+    if db is None:
+        return jsonify({"success": False, "message": "Database connection error."}), 503
+
+    data = request.json or {}
+    text = data.get("text")
+    if not text:
+        return jsonify({"success": False, "message": "Text required."}), 400
+
+    user_id = user["user_id"]
     now = datetime.now(timezone.utc)
     try:
         database.add_message_to_history(db, user_id, "user", text, now)
@@ -859,26 +1404,40 @@ def chat_endpoint():
         print("Error saving user message:", e)
 
     try:
-        history_docs = database.get_chat_history(db, user_id)
-        history = [{"sender": r.get("sender"), "message": r.get("message", "")} for r in history_docs]
+        history, summary_doc = load_chat_context(user_id)
     except Exception as e:
         print("Error loading history:", e)
-        history = []
+        history, summary_doc = [], None
+    summary = summary_doc.get("summary") if summary_doc else None
 
-    # --- NEW: Get user's name for the AI ---
-    profile = user_doc.get("profile", {})
-    user_name = profile.get("display_name", email.split("@")[0])
-    
-    # --- UPDATED: Pass the name to the model ---
-    reply = chat_with_model(text, history, user_name)
-    
-    enhanced = add_emojis_to_response(reply)
-    try:
-        database.add_message_to_history(db, user_id, "luvisa", enhanced, datetime.now(timezone.utc))
-    except Exception as e:
-        print("Error saving luvisa reply:", e)
+    user_name = user["display_name"]
 
-    return jsonify({"success": True, "reply": enhanced}), 200
+    def generate():
+        enhancer = ReplyStreamEnhancer()
+        try:
+            for delta in stream_chat_with_model(text, history, user_name, summary):
+                piece = enhancer.feed(delta)
+                if piece:
+                    yield _sse_event({"type": "token", "text": piece})
+            piece = enhancer.finish()
+            if piece:
+                yield _sse_event({"type": "token", "text": piece})
+        finally:
+            # Persist whatever was assembled, even if the client went away mid-stream
+            enhancer.finish()
+            enhanced = enhancer.emitted
+            if enhanced:
+                try:
+                    database.add_message_to_history(db, user_id, "luvisa", enhanced, datetime.now(timezone.utc))
+                except Exception as e:
+                    print("Error saving luvisa reply:", e)
+            maybe_update_summary(user_id, history, summary_doc, user_name)
+        yield _sse_event({"type": "done", "reply": enhanced})
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 # --- THIS IS THE END OF THE UPGRADED AI ---
 
 
@@ -886,17 +1445,13 @@ def chat_endpoint():
 # Chat history & forget memory
 # -----------------------
 @app.route("/api/chat_history", methods=["GET"])
-def load_chat_history_route():
+@session_user
+def load_chat_history_route(user):
+    db = get_db()
     if db is None:
         return jsonify({"success": False, "message": "Database connection error."}), 503
-    email = request.args.get("email")
-    if not email:
-        return jsonify({"success": False, "message": "Email required."}), 400
     try:
-        user_doc = database.get_user_by_email(db, email)
-        if not user_doc:
-            return jsonify({"success": False, "message": "User not found."}), 404
-        history = database.get_chat_history(db, user_doc["_id"])
+        history = database.get_chat_history(db, user["user_id"])
         
         # --- THIS IS THE LINE WITH THE ERROR ---
         formatted = [{"sender": r["sender"], "message": r["message"], "time": r.get("timestamp").strftime("%Y-%m-%d %H:%M:%S") if r.get("timestamp") else ""} for r in history]
@@ -908,16 +1463,14 @@ def load_chat_history_route():
 
 
 @app.route("/api/forget_memory", methods=["POST"])
-def forget_memory_route():
-    data = request.json or {}
-    email = data.get("email")
-    if not email:
-        return jsonify({"success": False, "message": "Email required."}), 400
+@session_user
+def forget_memory_route(user):
+    db = get_db()
+    if db is None:
+        return jsonify({"success": False, "message": "Database connection error."}), 503
     try:
-        user_doc = database.get_user_by_email(db, email)
-        if not user_doc:
-            return jsonify({"success": False, "message": "User not found."}), 404
-        database.delete_chat_history(db, user_doc["_id"])
+        if not database.delete_chat_history(db, user["user_id"]):
+            return jsonify({"success": False, "message": "Error forgetting memory."}), 500
         return jsonify({"success": True, "message": "Luvisa forgot your conversations."}), 200
     except Exception as e:
         print("Forget memory error:", e)
@@ -928,9 +1481,191 @@ def forget_memory_route():
 # API: Together Spaces
 # -----------------------
 SPACE_DURATION_SECONDS = 300 # 5 minutes
+TOGETHER_KEEPALIVE_SECONDS = 15
+# Each open SSE stream holds one worker thread (gthread) for the life of the space;
+# past this many per worker, /api/together/events answers 503 and clients poll instead
+TOGETHER_MAX_STREAMS = int(os.getenv("TOGETHER_MAX_STREAMS", 16))
+# Space messages live in together_messages, one document per message, keyed by a unique
+# (space_id, seq) index that also allocates the seq; together_spaces only holds metadata.
+# Both carry the space's expires_at: TTL indexes delete them, and every route filters on it
+# because the TTL monitor only runs about once a minute.
+
+
+def _active_space_filter(**criteria):
+    """Query for a space that hasn't expired yet, e.g. _active_space_filter(_id=ObjectId(space_id))."""
+    criteria["expires_at"] = {"$gt": datetime.now(timezone.utc)}
+    return criteria
+
+
+def _epoch(dt):
+    """Unix timestamp of a BSON datetime (returned naive, in UTC)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+class TogetherEventHub:
+    """
+    Fans together-space events out to the live (SSE) connections of this worker.
+    A single watcher thread per worker turns every new message and space update
+    from a MongoDB change stream into events, so members connected to other
+    gunicorn workers see them too. Without change streams (standalone mongod)
+    events could only reach this worker's subscribers, so live() is False and
+    clients poll instead.
+    """
+
+    def __init__(self, max_streams):
+        self.max_streams = max_streams
+        self._subscribers = {}
+        self._streams = 0
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._started = threading.Event()  # set once the first watch attempt succeeded or failed
+        self.watching = False
+
+    def live(self, timeout=2):
+        """Starts the watcher if needed; True while the change stream runs."""
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="together-watch", daemon=True)
+                self._watcher.start()
+        self._started.wait(timeout)
+        return self.watching
+
+    def subscribe(self, space_id):
+        """Returns the subscriber's queue, or None when this worker already serves max_streams streams."""
+        q = queue.Queue(maxsize=100)
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return None
+            self._streams += 1
+            self._subscribers.setdefault(space_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, space_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(space_id)
+            if subscribers and q in subscribers:
+                self._streams -= 1
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[space_id]
+
+    def publish(self, space_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(space_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow client; it resyncs from /api/together/history when it reconnects
+                pass
+
+    def notify(self, space_id, event):
+        """Called by the routes after a write; the change stream delivers it instead when active."""
+        if not self.watching:
+            self.publish(space_id, event)
+
+    def _watch(self):
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": "together_messages", "operationType": "insert"},
+            {"ns.coll": "together_spaces", "operationType": {"$in": ["update", "delete"]}}
+        ]}}]
+        while True:
+            try:
+                db = get_db()
+                if db is None:
+                    raise RuntimeError("no database connection")
+                with db.watch(pipeline) as stream:
+                    self.watching = True
+                    self._started.set()
+                    print("✅ Together change stream started.")
+                    for change in stream:
+                        self._dispatch_change(change)
+            except OperationFailure as e:
+                self.watching = False
+                self._started.set()
+                print(f"⚠️ Change streams unavailable, together spaces fall back to polling: {e}")
+                return
+            except Exception as e:
+                self.watching = False
+                self._started.set()
+                print(f"🔥 Together change stream error: {e}")
+                time.sleep(2)
+
+    def _dispatch_change(self, change):
+        if change["ns"]["coll"] == "together_messages":
+            message = change["fullDocument"]
+            seq = message["seq"]
+            self.publish(str(message["space_id"]), {"type": "message", "seq": seq, "message": _format_together_message(message, seq)})
+            return
+        space_id = str(change["documentKey"]["_id"])
+        if change["operationType"] == "delete":
+            self.publish(space_id, {"type": "expired"})
+            return
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        if "ai_active" in updated:
+            self.publish(space_id, {"type": "ai_state", "ai_active": updated["ai_active"]})
+
+
+together_hub = TogetherEventHub(TOGETHER_MAX_STREAMS)
+
+
+def _format_together_message(r, seq):
+    return {
+        "seq": seq,
+        "sender": r["sender"], 
+        "sender_name": r.get("sender_name", "Luvisa 💗" if r["sender"] == "luvisa" else "A user"),
+        "message": r["message"], 
+        "time": r.get("timestamp").strftime("%Y-%m-%d %H:%M:%S") if r.get("timestamp") else ""
+    }
+
+
+def _push_together_message(space_id, message):
+    """
+    Adds a message to a space and notifies live members.
+    The seq is the space's newest seq + 1 and is claimed by the insert itself (the unique
+    (space_id, seq) index rejects a seq another writer took first; we then re-read and retry),
+    so a seq only ever exists together with its message and seqs become visible in order:
+    pollers can never see seq n+1 before seq n.
+    Returns the space metadata (ai_active, expires_at and the message's "seq"), or None if the space is gone.
+    """
+    db = get_db()
+    space = db.together_spaces.find_one(_active_space_filter(_id=ObjectId(space_id)), {"ai_active": 1, "expires_at": 1})
+    if space is None:
+        return None
+    message.update({"space_id": space["_id"], "expires_at": space["expires_at"]})
+    message.setdefault("tokens", count_tokens(message.get("message", "")))
+    while True:
+        newest = db.together_messages.find_one({"space_id": space["_id"]}, {"_id": 0, "seq": 1}, sort=[("seq", -1)])
+        seq = newest["seq"] + 1 if newest else 0
+        message["seq"] = seq
+        message.pop("_id", None)
+        try:
+            db.together_messages.insert_one(message)
+            break
+        except DuplicateKeyError:
+            continue
+    together_hub.notify(space_id, {"type": "message", "seq": seq, "message": _format_together_message(message, seq)})
+    space["seq"] = seq
+    return space
+
+
+def _recent_together_messages(space_id, limit):
+    """The newest `limit` messages of a space, oldest first (range read on the space_id+seq index)."""
+    db = get_db()
+    cursor = db.together_messages.find(
+        {"space_id": ObjectId(space_id)},
+        {"_id": 0, "sender": 1, "message": 1, "tokens": 1}
+    ).sort("seq", -1).limit(limit)
+    messages = list(cursor)
+    messages.reverse()
+    return messages
+
 
 @app.route("/api/together/create", methods=["POST"])
 def create_together_space():
+    db = get_db()
     data = request.json or {}
     space_name = data.get("space_name")
     password = data.get("password")
@@ -940,29 +1675,17 @@ def create_together_space():
         return jsonify({"success": False, "message": "Space name and password required."}), 400
     
     try:
-        cutoff_time = datetime.now(timezone.utc) - timedelta(seconds=SPACE_DURATION_SECONDS)
-
-        # --- THIS IS THE NEW CODE ---
-        # 1. Clean up ALL expired spaces from the database
-        try:
-            db.together_spaces.delete_many({"created_at": {"$lt": cutoff_time}})
-        except Exception as e:
-            print(f"⚠️ Error during auto-cleanup of spaces: {e}")
-        # --- END OF NEW CODE ---
-
-
-        # 2. Check if an ACTIVE space with this name still exists
-        existing = db.together_spaces.find_one({
-            "name": space_name
-            # No time check needed, because we just deleted all expired ones
-        })
+        # 1. Check if an ACTIVE space with this name still exists
+        # (expired spaces are removed by the TTL index on expires_at)
+        existing = db.together_spaces.find_one(_active_space_filter(name=space_name), {"_id": 1})
         
         if existing:
             return jsonify({"success": False, "message": "Somebody is in that space. Try again after 10 min or create a space with another name."}), 409
         
-        # 3. Create the new space
-        hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+        # 2. Create the new space
+        hashed = passwords.hash_password(password)
         now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=SPACE_DURATION_SECONDS)
         
         welcome_msg = ""
         if with_ai:
@@ -974,18 +1697,23 @@ def create_together_space():
             "name": space_name,
             "hashed_password": hashed,
             "created_at": now,
-            "ai_active": with_ai, 
-            "history": [{
-                "sender": "luvisa",
-                "sender_name": "Luvisa 💗",
-                "message": welcome_msg,
-                "timestamp": now
-            }]
+            "expires_at": expires_at,
+            "ai_active": with_ai
         }
         
         result = db.together_spaces.insert_one(space_doc)
         space_id = str(result.inserted_id)
-        expires_at_timestamp = int(now.timestamp()) + SPACE_DURATION_SECONDS
+        db.together_messages.insert_one({
+            "space_id": result.inserted_id,
+            "seq": 0,
+            "sender": "luvisa",
+            "sender_name": "Luvisa 💗",
+            "message": welcome_msg,
+            "timestamp": now,
+            "expires_at": expires_at,
+            "tokens": count_tokens(welcome_msg)
+        })
+        expires_at_timestamp = _epoch(expires_at)
         
         return jsonify({
             "success": True, 
@@ -1000,6 +1728,7 @@ def create_together_space():
 
 @app.route("/api/together/join", methods=["POST"])
 def join_together_space():
+    db = get_db()
     data = request.json or {}
     space_name = data.get("space_name")
     password = data.get("password")
@@ -1007,21 +1736,20 @@ def join_together_space():
         return jsonify({"success": False, "message": "Space name and password required."}), 400
 
     try:
-        # This logic is still correct. It only finds ACTIVE spaces.
-        cutoff_time = datetime.now(timezone.utc) - timedelta(seconds=SPACE_DURATION_SECONDS)
-        space = db.together_spaces.find_one({
-            "name": space_name,
-            "created_at": {"$gt": cutoff_time}
-        })
+        # Only finds ACTIVE spaces
+        space = db.together_spaces.find_one(
+            _active_space_filter(name=space_name),
+            {"hashed_password": 1, "expires_at": 1}
+        )
 
         if not space:
             return jsonify({"success": False, "message": "Space not found. It may have expired."}), 404
         
-        if not bcrypt.checkpw(password.encode("utf-8"), space["hashed_password"]):
+        if not passwords.verify_password(password, space["hashed_password"]):
             return jsonify({"success": False, "message": "Invalid password."}), 401
         
         space_id = str(space["_id"])
-        expires_at_timestamp = int(space["created_at"].timestamp()) + SPACE_DURATION_SECONDS
+        expires_at_timestamp = _epoch(space["expires_at"])
         
         return jsonify({
             "success": True, 
@@ -1039,6 +1767,7 @@ def join_together_space():
 
 @app.route("/api/together/toggle_ai", methods=["POST"])
 def toggle_together_ai():
+    db = get_db()
     data = request.json or {}
     space_id = data.get("space_id")
     state = data.get("state") # This will be True or False
@@ -1047,15 +1776,14 @@ def toggle_together_ai():
         return jsonify({"success": False, "message": "Space ID and state required."}), 400
 
     try:
-        space = db.together_spaces.find_one({"_id": ObjectId(space_id)})
-        if not space:
-            return jsonify({"success": False, "message": "Space not found."}), 404
-
         # Update the ai_active flag in the database
-        db.together_spaces.update_one(
-            {"_id": ObjectId(space_id)},
+        result = db.together_spaces.update_one(
+            _active_space_filter(_id=ObjectId(space_id)),
             {"$set": {"ai_active": state}}
         )
+        if result.matched_count == 0:
+            return jsonify({"success": False, "message": "Space not found."}), 404
+        together_hub.notify(space_id, {"type": "ai_state", "ai_active": state})
         
         now = datetime.now(timezone.utc)
         status_msg = "Luvisa (AI) has been turned ON." if state else "Luvisa (AI) has been turned OFF."
@@ -1065,10 +1793,7 @@ def toggle_together_ai():
             "message": status_msg,
             "timestamp": now
         }
-        db.together_spaces.update_one(
-            {"_id": ObjectId(space_id)},
-            {"$push": {"history": notification_msg}}
-        )
+        _push_together_message(space_id, notification_msg)
 
         return jsonify({"success": True, "message": "AI state updated."}), 200
     except Exception as e:
@@ -1076,6 +1801,7 @@ def toggle_together_ai():
         return jsonify({"success": False, "message": "Server error."}), 500
 
 @app.route("/api/together/chat", methods=["POST"])
+@idempotent("together_chat", "space_id", "sender_name")
 def chat_in_together_space():
     data = request.json or {}
     space_id = data.get("space_id")
@@ -1094,25 +1820,15 @@ def chat_in_together_space():
             "timestamp": now
         }
         
-        space = db.together_spaces.find_one({"_id": ObjectId(space_id)})
+        space = _push_together_message(space_id, user_message)
         if not space:
             return jsonify({"success": False, "message": "Space not found or expired."}), 404
         
-        db.together_spaces.update_one(
-            {"_id": ObjectId(space_id)},
-            {"$push": {"history": user_message}}
-        )
-        
         if space.get("ai_active", True):
-            history_docs_with_new_msg = list(db.together_spaces.find_one(
-                {"_id": ObjectId(space_id)}, 
-                {"history": 1}
-            ).get("history", []))
-
-            history = [{"sender": r.get("sender"), "message": r.get("message", "")} for r in history_docs_with_new_msg]
+            history = _recent_together_messages(space_id, CHAT_CONTEXT_MESSAGES)
             
             reply = chat_with_model(text, history, sender_name)
-            enhanced = add_emojis_to_response(reply)
+            enhanced = enhance_reply(reply)
             
             ai_message = {
                 "sender": "luvisa", 
@@ -1120,10 +1836,7 @@ def chat_in_together_space():
                 "message": enhanced, 
                 "timestamp": datetime.now(timezone.utc)
             }
-            db.together_spaces.update_one(
-                {"_id": ObjectId(space_id)},
-                {"$push": {"history": ai_message}}
-            )
+            _push_together_message(space_id, ai_message)
         
         return jsonify({"success": True, "message": "Message sent."}), 200
 
@@ -1134,65 +1847,247 @@ def chat_in_together_space():
 
 @app.route("/api/together/history", methods=["GET"])
 def get_together_history():
+    """
+    Returns a space's messages. With ?since=<seq> only messages after that seq are
+    returned; "cursor" is the seq of the newest message returned (or `since`).
+    The ETag tracks that cursor and the AI state, so a matching If-None-Match gets a 304.
+    """
+    db = get_db()
     space_id = request.args.get("space_id")
     if not space_id:
         return jsonify({"success": False, "message": "Space ID required."}), 400
+
+    since = request.args.get("since", type=int)
+    if since is None or since < 0:
+        since = -1
     
     try:
-        space = db.together_spaces.find_one({"_id": ObjectId(space_id)})
+        space = db.together_spaces.find_one(_active_space_filter(_id=ObjectId(space_id)), {"ai_active": 1})
         if not space:
             return jsonify({"success": False, "message": "Space not found or expired."}), 404
+
+        history = list(db.together_messages.find(
+            {"space_id": ObjectId(space_id), "seq": {"$gt": since}},
+            {"_id": 0, "seq": 1, "sender": 1, "sender_name": 1, "message": 1, "timestamp": 1}
+        ).sort("seq", 1))
+
+        ai_active = space.get("ai_active", True)
+        # Seqs are claimed by the inserts themselves, so there are no gaps to wait for
+        cursor = history[-1]["seq"] if history else since
+        etag = f"{cursor}-{int(bool(ai_active))}"
+        # contains_weak: compressed responses carry the weak form of this ETag
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
         
-        history = space.get("history", [])
-        
-        formatted = [{
-            "sender": r["sender"], 
-            "sender_name": r.get("sender_name", "Luvisa 💗" if r["sender"] == "luvisa" else "A user"),
-            "message": r["message"], 
-            "time": r.get("timestamp").strftime("%Y-%m-%d %H:%M:%S") if r.get("timestamp") else ""
-        } for r in history]
+        formatted = [_format_together_message(r, r["seq"]) for r in history]
         
-        return jsonify({
+        response = jsonify({
             "success": True, 
             "history": formatted,
-            "ai_active": space.get("ai_active", True)
-        }), 200
+            "cursor": cursor,
+            "ai_active": ai_active
+        })
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response, 200
     
     except Exception as e:
         print(f"🔥 Error getting history: {e}")
         return jsonify({"success": False, "message": "Server error."}), 500
     
+@app.route("/api/together/events", methods=["GET"])
+def together_events():
+    """
+    Server-Sent Events stream for a together space.
+    Sends {"type": "ready"} once subscribed (clients then load history), followed by
+    "message", "ai_state" and finally "expired" events. Replaces 3-second polling.
+    503 when the change stream isn't running (events wouldn't reach other workers)
+    or this worker already serves TOGETHER_MAX_STREAMS streams; clients then poll.
+    """
+    db = get_db()
+    space_id = request.args.get("space_id")
+    if not space_id:
+        return jsonify({"success": False, "message": "Space ID required."}), 400
+
+    try:
+        space = db.together_spaces.find_one(
+            _active_space_filter(_id=ObjectId(space_id)),
+            {"expires_at": 1, "ai_active": 1}
+        )
+        if not space:
+            return jsonify({"success": False, "message": "Space not found or expired."}), 404
+    except Exception as e:
+        print(f"🔥 Error opening together events: {e}")
+        return jsonify({"success": False, "message": "Server error."}), 500
+
+    if not together_hub.live():
+        return jsonify({"success": False, "message": "Live updates unavailable; poll the history instead."}), 503
+    subscription = together_hub.subscribe(space_id)
+    if subscription is None:
+        return jsonify({"success": False, "message": "Too many live connections; poll the history instead."}), 503
+
+    expires_at_timestamp = _epoch(space["expires_at"])
+
+    def generate():
+        try:
+            yield _sse_event({"type": "ready", "ai_active": space.get("ai_active", True), "expires_at": expires_at_timestamp})
+            while time.time() < expires_at_timestamp:
+                try:
+                    event = subscription.get(timeout=TOGETHER_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse_event(event)
+                if event["type"] == "expired":
+                    return
+            yield _sse_event({"type": "expired"})
+        finally:
+            together_hub.unsubscribe(space_id, subscription)
+
+    response = Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    # Also when the client hangs up before the generator ever ran (its finally wouldn't)
+    response.call_on_close(lambda: together_hub.unsubscribe(space_id, subscription))
+    return response
+
+# -----------------------
+# Health checks
+# -----------------------
+# Authenticated, read-only Brevo endpoint used as the readiness probe
+BREVO_ACCOUNT_URL = os.getenv("BREVO_ACCOUNT_URL", BREVO_API_URL.split("/smtp/")[0] + "/account")
+# Dependencies that must answer for /readyz to return 200 (the others are only reported)
+READYZ_REQUIRED = [name.strip() for name in os.getenv("READYZ_REQUIRED", "mongo").split(",") if name.strip()]
+
+_started_at = time.time()
+
+readiness = health.ReadinessCheck({
+    "mongo": lambda: health.probe_mongo(get_db()),
+    "groq": lambda: health.probe_groq(get_groq_client(), health.READYZ_PROBE_TIMEOUT),
+    "brevo": lambda: health.probe_brevo(BREVO_ACCOUNT_URL, BREVO_API_KEY, health.READYZ_PROBE_TIMEOUT),
+}, required=READYZ_REQUIRED)
+
+
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving. Contacts no dependency."""
+    return jsonify({"status": "ok", "pid": os.getpid(), "uptime_seconds": round(time.time() - _started_at)}), 200
+
+
+@app.route("/readyz")
+def readyz():
+    """
+    Readiness: probes MongoDB, Groq and Brevo (concurrently, with timeouts) and
+    reports each one's latency with the Mongo pool settings and the Groq circuit
+    breakers. 503 unless every READYZ_REQUIRED dependency is reachable.
+    """
+    ready, checks = readiness.report()
+    llm = _current_llm()
+    return jsonify({
+        "status": "ready" if ready else "unready",
+        "checks": checks,
+        "groq_circuits": {target.name: target.breaker.state for target in llm.targets} if llm else {},
+        "mongo_pool": database.mongo_client_options(),
+        "email_queue": {"backlog": email_queue.backlog, **email_queue.stats}
+    }), 200 if ready else 503
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint (see metrics.py for what is collected)."""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
 # -----------------------
 # Frontend routes
 # -----------------------
+def _serve_page(filename):
+    """Serves an HTML page, with responsive <picture> markup once `manage.py build-assets` has run."""
+    page = assets.responsive_page(STATIC_FOLDER, filename)
+    if page is None:
+        return serve_static(filename)
+    return Response(page, mimetype="text/html")
+
+
+def serve_static(filename):
+    """
+    Static files, using the .br/.gz siblings from `manage.py build-assets` when the
+    client accepts them. Content-hashed assets are cached forever; everything else
+    is revalidated with its ETag.
+    """
+    variants = compression.precompressed_variants(STATIC_FOLDER, filename)
+    encoding = compression.choose_encoding(request.accept_encodings, variants)
+    if encoding:
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_from_directory(STATIC_FOLDER, filename + compression.SUFFIXES[encoding], mimetype=mimetype)
+        response.headers["Content-Encoding"] = encoding
+    else:
+        response = send_from_directory(STATIC_FOLDER, filename)
+    if variants:
+        response.vary.add("Accept-Encoding")
+    if assets.is_hashed_asset(filename):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+app.view_functions["static"] = serve_static
+
+
 @app.route("/")
 def serve_index():
-    return send_from_directory(STATIC_FOLDER, "login.html")
+    return _serve_page("login.html")
 
 
 @app.route("/chat")
 def serve_chat():
-    return send_from_directory(STATIC_FOLDER, "index.html")
+    return _serve_page("index.html")
 
 
 @app.route("/login")
 def serve_login():
-    return send_from_directory(STATIC_FOLDER, "login.html")
+    return _serve_page("login.html")
 
 
 @app.route("/signup")
 def serve_signup():
-    return send_from_directory(STATIC_FOLDER, "signup.html")
+    return _serve_page("signup.html")
 
 
 @app.route("/profile")
 def serve_profile():
-    return send_from_directory(STATIC_FOLDER, "profile.html")
+    return _serve_page("profile.html")
 
 
 @app.route("/together")
 def serve_together():
-    return send_from_directory(STATIC_FOLDER, "together.html")
+    return _serve_page("together.html")
+
+
+# -----------------------
+# App factory
+# -----------------------
+def create_app():
+    """
+    WSGI entry point (`gunicorn "main:create_app()"`). Routes are registered at import,
+    which only defines things; the database, Groq and Firebase connect on first use
+    in each worker. WARM_START=1 connects them here instead, i.e. in the worker
+    after the fork (don't combine it with gunicorn --preload).
+    """
+    if os.getenv("WARM_START", "0") == "1":
+        get_db()
+        get_llm()
+        firebase_ready()
+    if assets.load_manifest(STATIC_FOLDER) is None or not compression.has_precompressed(STATIC_FOLDER):
+        print("⚠️ Static assets aren't built (no image manifest or .br/.gz copies); "
+              "run `python manage.py build-assets` in the build step (see README).")
+    return app
 
 
 # -----------------------
@@ -1200,4 +2095,4 @@ def serve_together():
 # -----------------------
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 10000))
-    app.run(host="0.0.0.0", port=port)
+    create_app().run(host="0.0.0.0", port=port)
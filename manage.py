@@ -0,0 +1,96 @@
+"""
+Maintenance commands for Friendix.ai.
+
+Usage:
+    python manage.py indexes                 # apply the index registry, verify hot queries, report drift
+    python manage.py backfill-friend-ids     # number existing users by signup order and seed the counter
+    python manage.py build-assets            # AVIF/WebP image variants + web/assets/manifest.json,
+                                             # then .br/.gz copies of the text assets
+"""
+import sys
+import argparse
+
+import database
+import assets
+import compression
+
+
+def cmd_indexes(db, args):
+    """Applies database.INDEXES, then checks every hot query is an IXSCAN."""
+    database.ensure_indexes(db)
+    print("✅ Index registry applied.")
+
+    failures = 0
+    for result in database.verify_hot_queries(db):
+        mark = "✅" if result["ok"] else "🔥"
+        print(f"{mark} {result['name']} ({result['collection']}): {' -> '.join(result['stages']) or 'no plan'}")
+        if not result["ok"]:
+            failures += 1
+
+    report = database.index_report(db)
+    for entry in report["missing"]:
+        print(f"🔥 Missing index on {entry['collection']}: {entry['keys']}")
+    for entry in report["undeclared"]:
+        print(f"⚠️ Undeclared index on {entry['collection']}: {entry['name']}")
+    for entry in report["unused"]:
+        print(f"⚠️ Unused index (0 ops since server start) on {entry['collection']}: {entry['name']}")
+
+    return 1 if (failures or report["missing"]) else 0
+
+
+def cmd_backfill_friend_ids(db, args):
+    """Assigns friend IDs to users created before atomic allocation existed."""
+    database.backfill_friend_ids(db, batch_size=args.batch_size)
+    return 0
+
+
+def cmd_build_assets(db, args):
+    """Builds responsive image variants and precompressed text assets, and prints the savings."""
+    manifest = assets.build_assets(args.static_folder)
+    rows = assets.savings_report(manifest)
+    formats = [fmt for fmt, _ in assets.ASSET_FORMATS]
+
+    print(f"{'image':<28}{'original':>12}" + "".join(f"{fmt:>12}" for fmt in formats) + f"{'saved':>12}")
+    for row in rows:
+        print(f"{row['image']:<28}{_kb(row['original']):>12}"
+              + "".join(f"{_kb(row.get(fmt)):>12}" for fmt in formats)
+              + f"{_kb(row['saved']):>12}")
+    original = sum(row["original"] for row in rows)
+    saved = sum(row["saved"] for row in rows)
+    print(f"✅ {len(rows)} images: {_kb(original)} -> {_kb(original - saved)} at the largest width "
+          f"({_kb(saved)} saved, {saved * 100 // max(original, 1)}%).")
+
+    rows = compression.precompress_static(args.static_folder)
+    original = sum(row["original"] for row in rows)
+    smallest = sum(min(row.get("br", row["original"]), row.get("gzip", row["original"])) for row in rows)
+    if not compression.brotli:
+        print("⚠️ brotli is not installed; wrote gzip copies only.")
+    print(f"✅ {len(rows)} text assets precompressed: {_kb(original)} -> {_kb(smallest)} on the wire.")
+    return 0
+
+
+def _kb(size):
+    return "-" if size is None else f"{size / 1024:.0f} KB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Friendix.ai maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("indexes", help="Apply and verify MongoDB indexes").set_defaults(func=cmd_indexes)
+    backfill = subparsers.add_parser("backfill-friend-ids", help="Assign friend IDs to existing users")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    backfill.set_defaults(func=cmd_backfill_friend_ids)
+    build = subparsers.add_parser("build-assets", help="Build responsive AVIF/WebP image variants and .br/.gz text assets")
+    build.add_argument("--static-folder", default="web")
+    build.set_defaults(func=cmd_build_assets, needs_db=False)
+
+    args = parser.parse_args(argv)
+    db = None
+    if getattr(args, "needs_db", True):
+        database.load_config()
+        db = database.get_db()
+    return args.func(db, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
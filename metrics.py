@@ -0,0 +1,206 @@
+"""
+Prometheus metrics, served at /metrics.
+
+  - http_request_*: count and latency per route template; latency is measured when
+    the view returns, so for streamed responses (/api/chat/stream, /api/together/events)
+    it covers only the work before the headers go out, not the body
+  - chat_step_duration_seconds: where a /api/chat request spends its time
+  - groq_*: completion latency, time to first token and completion.usage tokens;
+    hedges, fail-overs and circuit breaker state (llm_client.ResilientLLM)
+  - mongodb_command_duration_seconds: every command, via pymongo command monitoring
+  - email_* / password_hash_*: the email queue and bcrypt pool counters
+
+With several gunicorn workers, point PROMETHEUS_MULTIPROC_DIR at an empty
+directory so /metrics aggregates the histograms of every worker (the email and
+bcrypt counters are always those of the worker that answers).
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from flask import request, g
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time until the view returns the response (headers only for streams)",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+CHAT_STEPS = Histogram(
+    "chat_step_duration_seconds", "Time spent in each step of a chat request", ["step"], buckets=LATENCY_BUCKETS
+)
+GROQ_LATENCY = Histogram(
+    "groq_request_duration_seconds", "Groq chat completion calls (whole stream for streamed calls)",
+    ["operation", "model", "outcome"], buckets=LATENCY_BUCKETS
+)
+GROQ_FIRST_TOKEN = Histogram(
+    "groq_time_to_first_token_seconds", "Time from request to the first streamed token",
+    ["model"], buckets=LATENCY_BUCKETS
+)
+GROQ_TOKENS = Counter(
+    "groq_tokens_total", "Tokens reported by Groq in completion.usage", ["operation", "model", "kind"]
+)
+MONGO_COMMANDS = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB commands as seen by pymongo command monitoring",
+    ["command", "collection", "outcome"], buckets=DB_BUCKETS
+)
+
+
+# -----------------------
+# Flask
+# -----------------------
+def instrument(app):
+    """
+    Times every request of `app` by its route template (404s are "unmatched"),
+    up to after_request: streamed bodies are not included (see GROQ_FIRST_TOKEN for chat).
+    """
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_LATENCY.labels(request.method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+        return response
+
+
+@contextmanager
+def chat_step(step):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        CHAT_STEPS.labels(step).observe(time.perf_counter() - start)
+
+
+# -----------------------
+# Groq
+# -----------------------
+def record_groq_call(operation, model, seconds, outcome, usage=None):
+    """`usage` is completion.usage (or the usage of the last stream chunk), when Groq sent one."""
+    GROQ_LATENCY.labels(operation, model, outcome).observe(seconds)
+    if usage is not None:
+        GROQ_TOKENS.labels(operation, model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        GROQ_TOKENS.labels(operation, model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def chunk_usage(chunk):
+    """Usage carried by a stream chunk: OpenAI-style `usage`, or Groq's `x_groq.usage` on the last chunk."""
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return usage
+
+
+# -----------------------
+# MongoDB
+# -----------------------
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Pass as MongoClient(event_listeners=[...]); records every command's duration."""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            target = event.command.get("collection", "")  # getMore names it here
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+    def _observe(self, event, outcome):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMANDS.labels(event.command_name, collection, outcome).observe(event.duration_micros / 1e6)
+
+
+# -----------------------
+# Counters kept by other modules
+# -----------------------
+class StatsCollector:
+    """Exposes EmailQueue.stats/backlog and passwords.hashing_stats() at scrape time."""
+
+    def __init__(self, email_queue, hashing_stats):
+        self.email_queue = email_queue
+        self.hashing_stats = hashing_stats
+
+    def collect(self):
+        emails = CounterMetricFamily("email_messages", "Transactional emails by outcome", labels=["outcome"])
+        for outcome, count in self.email_queue.stats.items():
+            emails.add_metric([outcome], count)
+        yield emails
+        yield GaugeMetricFamily("email_queue_backlog", "Emails waiting for a sender thread", value=self.email_queue.backlog)
+
+        operations = CounterMetricFamily("password_hash_operations", "bcrypt operations", labels=["operation"])
+        seconds = CounterMetricFamily(
+            "password_hash_seconds", "Time bcrypt operations spent queued and running", labels=["operation", "phase"]
+        )
+        for operation, stats in self.hashing_stats().items():
+            operations.add_metric([operation], stats["count"])
+            seconds.add_metric([operation, "wait"], stats["wait_seconds"])
+            seconds.add_metric([operation, "run"], stats["run_seconds"])
+        yield operations
+        yield seconds
+
+
+class LLMCollector:
+    """Exposes ResilientLLM.stats and each target's breaker state; `get_llm` returns None until one is built."""
+
+    def __init__(self, get_llm):
+        self.get_llm = get_llm
+
+    def collect(self):
+        llm = self.get_llm()
+        if llm is None:
+            return
+        events = CounterMetricFamily(
+            "groq_resilience_events", "Groq calls, hedges, fail-overs, breaker rejections and deadline misses", labels=["event"]
+        )
+        for event, count in llm.stats.items():
+            events.add_metric([event], count)
+        yield events
+        circuit = GaugeMetricFamily("groq_circuit_open", "1 while a target's breaker rejects calls", labels=["target", "model"])
+        for target in llm.targets:
+            circuit.add_metric([target.name, target.model], 1 if target.breaker.state == "open" else 0)
+        yield circuit
+
+
+_extra_collectors = []
+
+
+def register_collector(collector):
+    REGISTRY.register(collector)
+    _extra_collectors.append(collector)
+
+
+def render():
+    """Returns (body, content type) for the /metrics response."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _extra_collectors:
+            registry.register(collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,160 @@
+"""
+OTP stores for signup / reset codes.
+
+Records are small dicts ({"otp", "ts"} or {"otp", "expires"}) keyed by email.
+MongoOTPStore shares them between gunicorn workers and lets a TTL index expire
+them; MemoryOTPStore is per-process (single worker / local development) with a
+background sweeper and a size cap so unverified codes can't pile up.
+"""
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+OTP_COLLECTION = "otp_codes"
+
+
+def _expires_at(record, ttl_seconds):
+    """Unix time after which `record` is no longer valid."""
+    if "expires" in record:
+        return record["expires"]
+    return record.get("ts", int(time.time())) + ttl_seconds
+
+
+class OTPStore(ABC):
+    """Interface: put/get/delete by email, plus an atomic consume of a matching code."""
+
+    @abstractmethod
+    def put(self, email, record):
+        pass
+
+    @abstractmethod
+    def get(self, email):
+        """Returns the stored record (possibly expired but not yet evicted) or None."""
+
+    @abstractmethod
+    def delete(self, email):
+        pass
+
+    @abstractmethod
+    def consume(self, email, otp):
+        """Deletes the record only if its code is `otp`. Returns True if it did."""
+
+    def __contains__(self, email):
+        return self.get(email) is not None
+
+
+class MemoryOTPStore(OTPStore):
+    def __init__(self, ttl_seconds, max_entries=10000, sweep_interval=60):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+
+    def put(self, email, record):
+        self._ensure_sweeper()
+        with self._lock:
+            self._records.pop(email, None)
+            self._records[email] = dict(record)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)  # oldest first
+
+    def get(self, email):
+        with self._lock:
+            record = self._records.get(email)
+            return dict(record) if record else None
+
+    def delete(self, email):
+        with self._lock:
+            self._records.pop(email, None)
+
+    def consume(self, email, otp):
+        with self._lock:
+            record = self._records.get(email)
+            if record and str(record.get("otp")) == str(otp):
+                del self._records[email]
+                return True
+            return False
+
+    def sweep(self):
+        """Drops every expired record. Returns how many were removed."""
+        now = int(time.time())
+        with self._lock:
+            expired = [email for email, record in self._records.items() if _expires_at(record, self.ttl_seconds) < now]
+            for email in expired:
+                del self._records[email]
+        return len(expired)
+
+    def _ensure_sweeper(self):
+        # Started lazily (and again in a forked worker, where the thread doesn't survive)
+        if self._sweeper_pid == os.getpid():
+            return
+        self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_forever, daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️ OTP sweeper error: {e}")
+
+
+class MongoOTPStore(OTPStore):
+    """
+    One document per (purpose, email) in OTP_COLLECTION. The TTL index on
+    expires_at (see database.INDEXES) removes stale codes. The TTL monitor only
+    runs about once a minute, so get() can still return an expired record (callers
+    check its ts/expires) and consume() filters on expires_at itself.
+    """
+
+    def __init__(self, db, purpose, ttl_seconds):
+        self.collection = db[OTP_COLLECTION]
+        self.purpose = purpose
+        self.ttl_seconds = ttl_seconds
+
+    def _id(self, email):
+        return f"{self.purpose}:{email}"
+
+    def put(self, email, record):
+        expires_at = datetime.fromtimestamp(_expires_at(record, self.ttl_seconds), tz=timezone.utc)
+        self.collection.replace_one(
+            {"_id": self._id(email)},
+            {"record": record, "otp": str(record.get("otp")), "expires_at": expires_at},
+            upsert=True
+        )
+
+    def get(self, email):
+        doc = self.collection.find_one({"_id": self._id(email)}, {"record": 1})
+        return doc.get("record") if doc else None
+
+    def delete(self, email):
+        self.collection.delete_one({"_id": self._id(email)})
+
+    def consume(self, email, otp):
+        result = self.collection.delete_one({
+            "_id": self._id(email), "otp": str(otp), "expires_at": {"$gt": datetime.now(timezone.utc)}
+        })
+        return result.deleted_count == 1
+
+
+def make_otp_store(db, purpose, ttl_seconds, backend=None):
+    """
+    Builds the store selected by OTP_STORE ("mongo" or "memory").
+    Defaults to Mongo when a database is available, since only that works across workers.
+    """
+    backend = (backend or os.getenv("OTP_STORE") or ("mongo" if db is not None else "memory")).lower()
+    if backend == "mongo":
+        if db is not None:
+            return MongoOTPStore(db, purpose, ttl_seconds)
+        print(f"⚠️ OTP_STORE=mongo but no database; using an in-memory {purpose} OTP store.")
+    return MemoryOTPStore(
+        ttl_seconds,
+        max_entries=int(os.getenv("OTP_MEMORY_MAX_ENTRIES", 10000)),
+        sweep_interval=int(os.getenv("OTP_SWEEP_SECONDS", 60))
+    )
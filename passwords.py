@@ -0,0 +1,127 @@
+"""
+Password hashing for Friendix.ai.
+
+bcrypt is deliberately slow, so it runs in a small process pool instead of on the
+request thread: a login burst then queues on the pool (bounded by BCRYPT_MAX_PENDING)
+rather than pinning every web worker's CPU and starving chat requests.
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+# Cost factor for new hashes; existing hashes with another cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Hashing processes per web worker (0 = hash on the calling thread)
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", 2))
+# Max hash/verify operations in flight (queued + running) per web worker
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 64))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+# --- Pool workers (run in the hashing processes) ---
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+def _timed(fn, *args):
+    # Timed in the hashing process, so the run time excludes the wait inside the pool
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _get_pool():
+    """Creates the pool lazily, and again after a fork (gunicorn workers must not share it)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # Never fork the web worker itself: its request and pymongo threads may hold locks
+            # the child would inherit. The hashing processes are long-lived, so startup cost is moot.
+            # Their children import the __main__ module, so entry scripts need the `if __name__ == "__main__"` guard.
+            try:
+                context = multiprocessing.get_context("forkserver")
+            except ValueError:
+                context = multiprocessing.get_context("spawn")  # platform without forkserver
+            _pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS, mp_context=context)
+            _pool_pid = os.getpid()
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+def _record(operation, wait_seconds, run_seconds):
+    with _stats_lock:
+        stats = _stats.setdefault(operation, {"count": 0, "wait_seconds": 0.0, "run_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["wait_seconds"] += wait_seconds
+        stats["run_seconds"] += run_seconds
+        stats["max_seconds"] = max(stats["max_seconds"], wait_seconds + run_seconds)
+
+def _run(operation, fn, *args):
+    """Runs fn on the pool; wait_seconds covers queueing for a slot and inside the pool."""
+    started = time.perf_counter()
+    with _slots:
+        if BCRYPT_WORKERS > 0:
+            try:
+                result, run_seconds = _get_pool().submit(_timed, fn, *args).result()
+            except BrokenProcessPool:
+                print("⚠️ Password hashing pool died; recreating it.")
+                _reset_pool()
+                result, run_seconds = _timed(fn, *args)
+        else:
+            result, run_seconds = _timed(fn, *args)
+    _record(operation, time.perf_counter() - started - run_seconds, run_seconds)
+    return result
+
+
+# --- Public API ---
+
+def hash_password(password):
+    """Returns the bcrypt hash (bytes) of `password` at the configured cost."""
+    return _run("hash", _hash, password.encode("utf-8"), BCRYPT_ROUNDS)
+
+def verify_password(password, hashed):
+    """Checks `password` against a stored bcrypt hash (bytes or str)."""
+    if not password or not hashed:
+        return False
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    try:
+        return _run("verify", _check, password.encode("utf-8"), hashed)
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+def hash_cost(hashed):
+    """Cost factor encoded in a bcrypt hash ("$2b$12$..." -> 12), or None."""
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    try:
+        return int(bytes(hashed).split(b"$")[2])
+    except (IndexError, ValueError, TypeError):
+        return None
+
+def needs_rehash(hashed):
+    return hash_cost(hashed) != BCRYPT_ROUNDS
+
+def hashing_stats():
+    """Per-operation timings: {"hash"|"verify": {count, wait_seconds, run_seconds, max_seconds}}."""
+    with _stats_lock:
+        return {operation: dict(stats) for operation, stats in _stats.items()}
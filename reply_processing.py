@@ -0,0 +1,175 @@
+"""
+Post-processing for Luvisa's replies: branding filter + inline emoji enrichment.
+
+Everything is done by one precompiled regex in a single left-to-right scan, and
+the same scanner can be fed a reply chunk by chunk while it is being streamed.
+Output is identical to the original per-keyword implementation
+(see benchmarks/bench_reply_processing.py).
+"""
+import re
+
+BRAND_NAME = "Friendix.ai"
+
+# Order matters: the longest form wins at a given position, like the old chained .replace() calls
+BRAND_PATTERNS = ["**OpenAI**", "OpenAI", "ChatGPT", "openai"]
+
+INLINE_EMOJI_MAP = {
+    "love": "❤️", "happy": "😊", "sad": "😥", "laugh": "😂", "smile": "😄", "cry": "😢",
+    "miss you": "🥺", "kiss": "😘", "hug": "🤗", "think": "🤔", "sweet": "🥰", "blush": "😊",
+    "heart": "❤️", "star": "⭐", "yay": "🎉", "oh no": "😟", "sorry": "😔", "please": "🙏",
+    "hi": "👋", "hello": "👋", "bye": "👋", "good night": "😴", "sleep": "😴", "dream": "💭"
+}
+
+_KEYWORDS = list(INLINE_EMOJI_MAP)
+_KEYWORD_ALTERNATION = "|".join(f"(?P<k{i}>{re.escape(k)})" for i, k in enumerate(_KEYWORDS))
+_BRAND_ALTERNATION = "|".join(re.escape(p) for p in BRAND_PATTERNS)
+
+_KEYWORD_RE = re.compile(rf"(?i:\b(?:{_KEYWORD_ALTERNATION})\b)")
+_COMBINED_RE = re.compile(rf"(?P<brand>{_BRAND_ALTERNATION})|(?i:\b(?:{_KEYWORD_ALTERNATION})\b)")
+_BRAND_RE = re.compile(_BRAND_ALTERNATION)
+
+# "**OpenAI**" starts/ends with a non-word char but its replacement doesn't,
+# which changes the \b boundary seen by a keyword right next to it.
+_SPACED_BRAND = "**OpenAI**"
+
+# Longest pattern; a match is only final once this many chars follow it
+_LOOKAHEAD = max(len(p) for p in BRAND_PATTERNS + _KEYWORDS)
+
+
+class ReplyPostProcessor:
+    """
+    Single-pass scanner. feed() returns the part of the output that can no longer
+    change; finish() flushes the rest. With filter_branding=True the output equals
+    add_emojis_to_response(filter_response(text)) of the legacy code, otherwise
+    add_emojis_to_response(text).
+    """
+
+    def __init__(self, filter_branding=True):
+        self._pattern = _COMBINED_RE if filter_branding else _KEYWORD_RE
+        self._strip = filter_branding
+        self._buf = ""
+        self._ctx = 0  # chars at the start of _buf already emitted (kept for \b lookbehind)
+        self._after_spaced_brand = False
+        self._started = not filter_branding
+        self._used = set()
+
+    def feed(self, chunk):
+        if not self._started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                return ""
+            self._started = True
+        self._buf += chunk
+        return self._scan(final=False)
+
+    def finish(self):
+        return self._scan(final=True)
+
+    def _scan(self, final):
+        buf = self._buf
+        pos = self._ctx
+        end = len(buf.rstrip()) if (final and self._strip) else len(buf)
+        spaced_brand_end = pos if self._after_spaced_brand else -1
+        out = []
+
+        literal_limit = end if final else len(buf) - _LOOKAHEAD
+        for m in self._pattern.finditer(buf, pos, end):
+            if not final and m.end() + _LOOKAHEAD > len(buf):
+                # A longer match (e.g. "**OpenAI**") may still start before this one
+                literal_limit = min(m.start(), literal_limit)
+                break
+            out.append(buf[pos:m.start()])
+            group = m.lastgroup
+            if group == "brand":
+                out.append(BRAND_NAME)
+                if m.group() == _SPACED_BRAND:
+                    spaced_brand_end = m.end()
+            elif (group in self._used
+                    or m.start() == spaced_brand_end
+                    or (self._strip and buf.startswith(_SPACED_BRAND, m.end()))):
+                out.append(m.group())
+            else:
+                self._used.add(group)
+                out.append(m.group() + " " + INLINE_EMOJI_MAP[_KEYWORDS[int(group[1:])]])
+            pos = m.end()
+
+        if not final and self._strip:
+            # Trailing whitespace may turn out to be the end of the reply (stripped)
+            literal_limit = min(literal_limit, len(buf.rstrip()))
+        if literal_limit > pos:
+            out.append(buf[pos:literal_limit])
+            pos = literal_limit
+
+        self._after_spaced_brand = (pos == spaced_brand_end)
+        keep_from = max(pos - 1, 0)
+        self._buf = buf[keep_from:]
+        self._ctx = pos - keep_from
+        return "".join(out)
+
+
+def _transform(text, pattern, filter_branding):
+    """Whole-text fast path: same rules as ReplyPostProcessor._scan, literals copied by re.sub in C."""
+    used = set()
+    spaced_brand_end = -1
+
+    def replace(m):
+        nonlocal spaced_brand_end
+        group = m.lastgroup
+        if group == "brand":
+            if m.group() == _SPACED_BRAND:
+                spaced_brand_end = m.end()
+            return BRAND_NAME
+        if (group in used
+                or m.start() == spaced_brand_end
+                or (filter_branding and text.startswith(_SPACED_BRAND, m.end()))):
+            return m.group()
+        used.add(group)
+        return m.group() + " " + INLINE_EMOJI_MAP[_KEYWORDS[int(group[1:])]]
+
+    return pattern.sub(replace, text)
+
+
+def enhance_reply(response_text):
+    """Branding filter + emoji enrichment in one scan."""
+    if not isinstance(response_text, str):
+        response_text = str(response_text)
+    return _transform(response_text.strip(), _COMBINED_RE, True)
+
+
+def filter_response(response_text):
+    if not isinstance(response_text, str):
+        response_text = str(response_text)
+    return _BRAND_RE.sub(BRAND_NAME, response_text).strip()
+
+
+def add_emojis_to_response(response_text):
+    if not isinstance(response_text, str):
+        response_text = str(response_text)
+    return _transform(response_text, _KEYWORD_RE, False)
+
+
+class ReplyStreamEnhancer:
+    """
+    Streaming wrapper used by /api/chat/stream: feed() raw model deltas, get back
+    post-processed pieces; `emitted` holds everything returned so far.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.emitted = ""
+        self._processor = ReplyPostProcessor()
+        self._finished = False
+
+    def feed(self, delta):
+        self.raw += delta
+        piece = self._processor.feed(delta)
+        self.emitted += piece
+        return piece
+
+    def finish(self):
+        if self._finished:
+            return ""
+        self._finished = True
+        piece = self._processor.finish()
+        self.emitted += piece
+        return piece
@@ -0,0 +1,199 @@
+"""
+Unit tests for llm_client: breaker transitions, hedging, the deadline and stream
+cleanup, against stub clients (no network).
+
+Usage:
+    python -m unittest discover tests     (or: python -m pytest tests)
+"""
+import os
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from llm_client import CircuitBreaker, LLMTarget, LLMUnavailable, ResilientLLM  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class StubStream:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        for i, chunk in enumerate(self.chunks):
+            if i and self.error is not None:
+                raise self.error
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class StubClient:
+    """Answers after `delay` seconds, or raises `error`; streams carry `stream_error` after the first chunk."""
+
+    def __init__(self, delay=0.0, error=None, stream_error=None):
+        self.delay = delay
+        self.error = error
+        self.stream_error = stream_error
+        self.timeouts = []
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, timeout, max_retries):
+        self.timeouts.append(timeout)
+        return self
+
+    def _create(self, model, messages, stream=False, **params):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        if stream:
+            result = StubStream(["a", "b", "c"], self.stream_error)
+            self.streams.append(result)
+            return result
+        return SimpleNamespace(model=model)
+
+
+def target(name, client, failures=3, reset_seconds=30):
+    return LLMTarget(name, client, f"{name}-model", CircuitBreaker(name, failures, reset_seconds))
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("t", failure_threshold=2, reset_seconds=30)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker("t", failure_threshold=2, reset_seconds=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_half_open_lets_one_trial_through_then_closes(self):
+        breaker = CircuitBreaker("t", failure_threshold=1, reset_seconds=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, "half_open")
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        breaker = CircuitBreaker("t", failure_threshold=5, reset_seconds=0.05)
+        for _ in range(5):
+            breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+
+class ResilientLLMTest(unittest.TestCase):
+    def test_fast_primary_is_not_hedged(self):
+        llm = ResilientLLM(target("primary", StubClient()), target("secondary", StubClient()), 2, 0.2)
+        completion, answered = llm.complete(MESSAGES)
+        self.assertIs(answered, llm.primary)
+        self.assertEqual(completion.model, "primary-model")
+        self.assertEqual(llm.stats["hedged"], 0)
+
+    def test_slow_primary_is_hedged_to_the_secondary(self):
+        llm = ResilientLLM(target("primary", StubClient(delay=0.5)), target("secondary", StubClient()), 2, 0.05)
+        start = time.monotonic()
+        completion, answered = llm.complete(MESSAGES)
+        self.assertIs(answered, llm.secondary)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual((llm.stats["hedged"], llm.stats["secondary_wins"]), (1, 1))
+
+    def test_model_override_applies_to_the_primary_only(self):
+        llm = ResilientLLM(target("primary", StubClient()), target("secondary", StubClient()), 2, 0.2)
+        completion, _ = llm.complete(MESSAGES, model="summary-model")
+        self.assertEqual(completion.model, "summary-model")
+
+    def test_deadline_bounds_the_call_and_the_sdk_timeout(self):
+        client = StubClient(delay=1)
+        llm = ResilientLLM(target("primary", client), None, 0.1, 0.05)
+        start = time.monotonic()
+        with self.assertRaises(LLMUnavailable):
+            llm.complete(MESSAGES)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(llm.stats["deadline_exceeded"], 1)
+        self.assertLessEqual(client.timeouts[0], 0.1)
+
+    def test_provider_error_fails_over_immediately(self):
+        llm = ResilientLLM(target("primary", StubClient(error=StatusError(503))), target("secondary", StubClient()), 2, 5)
+        start = time.monotonic()
+        _, answered = llm.complete(MESSAGES)
+        self.assertIs(answered, llm.secondary)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(llm.stats["failed_over"], 1)
+        self.assertEqual(llm.primary.breaker._failures, 1)
+
+    def test_client_error_is_raised_without_tripping_the_breaker(self):
+        llm = ResilientLLM(target("primary", StubClient(error=StatusError(400)), failures=1), target("secondary", StubClient()), 2, 5)
+        with self.assertRaises(StatusError):
+            llm.complete(MESSAGES)
+        self.assertEqual(llm.primary.breaker.state, "closed")
+        self.assertEqual(llm.stats["failed_over"], 0)
+
+    def test_open_primary_fails_fast(self):
+        llm = ResilientLLM(target("primary", StubClient(delay=1), failures=1), None, 2, 0.05)
+        llm.primary.breaker.record_failure()
+        start = time.monotonic()
+        with self.assertRaises(LLMUnavailable):
+            llm.complete(MESSAGES)
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(llm.stats["rejected"], 1)
+
+    def test_hedge_rejected_by_an_open_secondary_is_not_counted(self):
+        llm = ResilientLLM(target("primary", StubClient(delay=0.2)), target("secondary", StubClient(), failures=1), 2, 0.05)
+        llm.secondary.breaker.record_failure()
+        _, answered = llm.complete(MESSAGES)
+        self.assertIs(answered, llm.primary)
+        self.assertEqual((llm.stats["hedged"], llm.stats["rejected"]), (0, 1))
+
+    def test_losing_stream_is_closed(self):
+        slow, fast = StubClient(delay=0.3), StubClient()
+        llm = ResilientLLM(target("primary", slow), target("secondary", fast), 2, 0.05)
+        chunks, answered = llm.stream(MESSAGES)
+        self.assertIs(answered, llm.secondary)
+        self.assertEqual(list(chunks), ["a", "b", "c"])
+        self.assertTrue(wait_for(lambda: slow.streams and slow.streams[0].closed))
+        self.assertFalse(fast.streams[0].closed)
+
+    def test_mid_stream_provider_failure_counts_against_the_breaker(self):
+        llm = ResilientLLM(target("primary", StubClient(stream_error=StatusError(502)), failures=1), None, 2, 0)
+        chunks, _ = llm.stream(MESSAGES)
+        with self.assertRaises(StatusError):
+            list(chunks)
+        self.assertEqual(llm.primary.breaker.state, "open")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+// ---------- Responsive image variants ----------
+// Built by `python manage.py build-assets` (AVIF/WebP at a few widths, listed in
+// assets/manifest.json). Without a build, the original file is used.
+let assetManifestPromise = null;
+
+function loadAssetManifest() {
+    if (!assetManifestPromise) {
+        assetManifestPromise = fetch('assets/manifest.json')
+            .then(r => (r.ok ? r.json() : {}))
+            .catch(() => ({}));
+    }
+    return assetManifestPromise;
+}
+
+// Smallest variant at least as wide as the element on this screen (or the largest one)
+function pickVariant(variants, cssWidth) {
+    const needed = cssWidth * (window.devicePixelRatio || 1);
+    return variants.find(v => v.width >= needed) || variants[variants.length - 1];
+}
+
+// Sets `path` as the element's background, using the best format/width available
+async function setBackgroundAsset(element, path) {
+    if (!element) return;
+    const entry = (await loadAssetManifest()).images?.[path];
+    if (!entry) {
+        element.style.backgroundImage = `url('${path}')`;
+        return;
+    }
+    const cssWidth = element.clientWidth || window.innerWidth;
+    const candidates = ['avif', 'webp']
+        .filter(format => entry.variants[format]?.length)
+        .map(format => `url('${pickVariant(entry.variants[format], cssWidth).url}') type('image/${format}')`);
+    const imageSet = `image-set(${[...candidates, `url('${path}') type('${entry.type}')`].join(', ')})`;
+
+    if (CSS.supports('background-image', imageSet)) {
+        element.style.backgroundImage = imageSet;
+    } else if (entry.variants.webp?.length) {
+        // No type() negotiation in this browser; WebP is supported nearly everywhere
+        element.style.backgroundImage = `url('${pickVariant(entry.variants.webp, cssWidth).url}')`;
+    } else {
+        element.style.backgroundImage = `url('${path}')`;
+    }
+}
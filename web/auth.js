@@ -80,10 +80,14 @@ async function handleAutoLogin() {
         return;
     }
 
+    const headers = { "Content-Type": "application/json" };
+    const sessionToken = localStorage.getItem("luvisa_session");
+    if (sessionToken) headers["Authorization"] = `Bearer ${sessionToken}`;
+
     try {
         const response = await fetch(`${BACKEND_URL}/api/auto_login_check`, {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
+            headers,
             body: JSON.stringify({ email: savedUser }),
         });
 
@@ -92,9 +96,11 @@ async function handleAutoLogin() {
             window.location.href = "/chat";
         } else {
             localStorage.removeItem("luvisa_user");
+            localStorage.removeItem("luvisa_session");
         }
     } catch (err) {
         localStorage.removeItem("luvisa_user");
+        localStorage.removeItem("luvisa_session");
     }
 }
 
@@ -105,7 +111,7 @@ function setRandomBackground() {
         "backgrounds/bg2.jpg"
     ];
     const selected = backgrounds[Math.floor(Math.random() * backgrounds.length)];
-    if (selected) document.body.style.backgroundImage = `url('${selected}')`;
+    if (selected) setBackgroundAsset(document.body, selected);
 }
 
 // ✅ OTP Modal
@@ -304,6 +310,8 @@ async function loginUser() {
 
         if (resp.ok && data.success) {
             localStorage.setItem("luvisa_user", email);
+            if (data.session_token) localStorage.setItem("luvisa_session", data.session_token);
+            else localStorage.removeItem("luvisa_session");
             window.location.href = "/chat";
         }
 
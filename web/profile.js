@@ -111,13 +111,21 @@ async function loadPublicProfile(friendId) {
 }
 
 
+/**
+ * Authorization header for the signed session token, if the user has one
+ */
+function sessionHeaders() {
+    const token = localStorage.getItem('luvisa_session');
+    return token ? { 'Authorization': `Bearer ${token}` } : {};
+}
+
 /**
  * Loads the logged-in user's profile using their email
  */
 async function loadCurrentProfile(email) {
     saveMessage.textContent = 'Loading profile...';
     try {
-        const response = await fetch(`/api/profile?email=${encodeURIComponent(email)}`);
+        const response = await fetch(`/api/profile?email=${encodeURIComponent(email)}`, { headers: sessionHeaders() });
         const data = await response.json();
 
         if (response.ok && data.success && data.profile) {
@@ -297,6 +305,7 @@ async function saveProfileChanges(username) {
     try {
         const response = await fetch(`/api/profile`, { // Relative URL
             method: 'POST',
+            headers: sessionHeaders(),
             body: formData
         });
         const data = await response.json();
@@ -306,6 +315,8 @@ async function saveProfileChanges(username) {
             saveMessage.className = 'save-message success';
 
             populateProfileData(data.profile); // Re-use the populate function
+            // The token carries the display name, so keep the refreshed one
+            if (data.session_token) localStorage.setItem('luvisa_session', data.session_token);
             
             currentAvatarFile = null; // Reset file state
             avatarUpload.value = ''; // Clear the file input visually
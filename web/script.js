@@ -36,12 +36,17 @@ const luvisaChatButton = document.getElementById('luvisaChatButton');
 // --- End new elements ---
 
 let username = localStorage.getItem('luvisa_user') || null;
+// Signed session token from login/signup (older sessions only have the email)
+const sessionToken = localStorage.getItem('luvisa_session');
+function authHeaders(headers = {}) {
+    return sessionToken ? { ...headers, 'Authorization': `Bearer ${sessionToken}` } : headers;
+}
 
 // --- Connect header button to action ---
 headerForgetBtn?.addEventListener('click', async ()=>{
   if (!confirm('Do you want to really forget the conversation😥?')) return;
   try {
-      const response = await fetch(`/api/forget_memory`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ email: username }) });
+      const response = await fetch(`/api/forget_memory`, { method: 'POST', headers: authHeaders({ 'Content-Type': 'application/json' }), body: JSON.stringify({ email: username }) });
       const data = await response.json();
       alert(data.message); if (response.ok && data.success) chatbox.innerHTML = '';
   } catch (e) { console.error('Forget err:', e); alert('Could not forget.'); }
@@ -54,7 +59,7 @@ document.addEventListener("DOMContentLoaded", () => { setRandomBackground(); });
 function setRandomBackground() {
     const backgrounds = [ "backgrounds/bg1.jpg", "backgrounds/bg2.jpg", "backgrounds/bg3.jpg", "backgrounds/bg4.jpg", "backgrounds/bg5.jpg","backgrounds/bg6.jpg","backgrounds/bg7.jpg","backgrounds/bg8.jpg","backgrounds/bg10.jpg","backgrounds/bg12.jpg","backgrounds/bg13.jpg","backgrounds/bg14.jpg","backgrounds/bg15.jpg" ];
     const randomBg = backgrounds[Math.floor(Math.random() * backgrounds.length)];
-    if (chatbox) chatbox.style.backgroundImage = `url('${randomBg}')`;
+    setBackgroundAsset(chatbox, randomBg);
 }
 
 // ---------- Initialization ----------
@@ -79,7 +84,7 @@ window.addEventListener('DOMContentLoaded', async () => {
     if(sidebarLogoutBtn) { 
         sidebarLogoutBtn.addEventListener('click', () => {
             if (!confirm('Logout?')) return;
-            localStorage.removeItem('luvisa_user'); window.location.href = 'login.html';
+            localStorage.removeItem('luvisa_user'); localStorage.removeItem('luvisa_session'); window.location.href = 'login.html';
         });
     }
 
@@ -221,7 +226,7 @@ function updateOverlayVisibility() {
 // ---------- Profile / header ----------
 async function loadAndApplyProfile(user) {
     try {
-        const response = await fetch(`/api/profile?email=${encodeURIComponent(user)}`);
+        const response = await fetch(`/api/profile?email=${encodeURIComponent(user)}`, { headers: authHeaders() });
         const data = await response.json();
 
         if (response.ok && data.success && data.profile) {
@@ -230,7 +235,7 @@ async function loadAndApplyProfile(user) {
             localStorage.setItem('luvisa_display_name', displayName); // <-- ADD THIS LINE
 
             if (profile.avatar) {
-                const avatarUrl = profile.avatar + '?t=' + new Date().getTime();
+                const avatarUrl = profile.avatar; // Versioned by content hash; safe to cache
                 if (dropdownAvatar) dropdownAvatar.src = avatarUrl;
                 if (userAvatarHeader) userAvatarHeader.src = avatarUrl;
             } else {
@@ -264,7 +269,12 @@ async function loadAndApplyProfile(user) {
 // ---------- Chat history ----------
 async function loadChatHistory(user) {
     try {
-        const response = await fetch(`/api/chat_history?email=${encodeURIComponent(user)}`);
+        const response = await fetch(`/api/chat_history?email=${encodeURIComponent(user)}`, { headers: authHeaders() });
+        if (response.status === 401) {
+            // Session token expired: log in again
+            localStorage.removeItem('luvisa_user'); localStorage.removeItem('luvisa_session');
+            window.location.href = 'login.html'; return;
+        }
         const data = await response.json();
 
         if (response.ok && data.success) {
@@ -325,20 +335,55 @@ async function sendMessage() {
     const typing = showTypingBubble();
 
     try {
-        const response = await fetch(`/api/chat`, {
+        const response = await fetch(`/api/chat/stream`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({ email: username, text: text })
         });
-        const data = await response.json();
 
-        if (typing?.parentNode) typing.parentNode.removeChild(typing);
+        if (!response.ok || !response.body) {
+            const data = await response.json().catch(() => ({}));
+            if (typing?.parentNode) typing.parentNode.removeChild(typing);
+            console.error('Reply err:', data.message); appendMessage('luvisa', data.message || "Sorry... 💔");
+            return;
+        }
 
-        if (response.ok && data.success) {
-            appendMessage('luvisa', data.reply);
+        // Read Server-Sent Events: {"type":"token","text":...} ... {"type":"done","reply":...}
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let replyText = null;
+        let replyWrapper = null;
+
+        const handleEvent = (evt) => {
+            if (!replyWrapper) {
+                if (typing?.parentNode) typing.parentNode.removeChild(typing);
+                replyWrapper = appendMessage('luvisa', '');
+                replyText = replyWrapper.querySelector('.message-text');
+            }
+            if (evt.type === 'token') replyText.textContent += evt.text;
+            else if (evt.type === 'done') replyText.textContent = evt.reply;
+            chatbox.scrollTop = chatbox.scrollHeight;
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+                const dataLine = rawEvent.split('\n').find(l => l.startsWith('data: '));
+                if (dataLine) handleEvent(JSON.parse(dataLine.slice(6)));
+            }
+        }
+
+        if (typing?.parentNode) typing.parentNode.removeChild(typing);
+        if (replyWrapper) {
             if (notifySound) notifySound.play().catch(e => console.warn("Audio err:", e));
         } else {
-            console.error('Reply err:', data.message); appendMessage('luvisa', data.message || "Sorry... 💔");
+            appendMessage('luvisa', "Sorry... 💔");
         }
     } catch (err) {
         if (typing?.parentNode) typing.parentNode.removeChild(typing);
@@ -346,4 +391,3 @@ async function sendMessage() {
         console.error('Send network error:', err);
     }
 }
-
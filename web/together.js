@@ -22,7 +22,11 @@ document.addEventListener('DOMContentLoaded', () => {
     let spaceExpiryTime = null;
     let historyPollInterval = null;
     let timerInterval = null;
-    let lastMessageCount = 0;
+    let lastSeq = -1; // every seq up to here is rendered (the history cursor)
+    const seenSeqs = new Set();
+    let liveEvents = null;
+    let pendingEchoes = [];
+    let historyEtag = null;
     
     const displayName = localStorage.getItem('luvisa_display_name') || 'A user';
 
@@ -118,8 +122,7 @@ document.addEventListener('DOMContentLoaded', () => {
         });
 
         startTimers();
-        loadChatHistory(); // Load history (and AI state)
-        historyPollInterval = setInterval(loadChatHistory, 3000); 
+        connectLiveUpdates(); // Push updates; loads history (and AI state) once connected
         
         // Background is already set, so no need to call it again here
         
@@ -133,9 +136,7 @@ document.addEventListener('DOMContentLoaded', () => {
         
         // --- UPDATED: Target the main container ---
         const container = document.querySelector('.together-container');
-        if (container) {
-            container.style.backgroundImage = `url('${randomBg}')`;
-        }
+        setBackgroundAsset(container, randomBg);
     }
     // --- END UPDATED FUNCTION ---
 
@@ -178,7 +179,66 @@ document.addEventListener('DOMContentLoaded', () => {
         }, 1000);
     }
     
+    // --- Live updates (Server-Sent Events), with polling as a fallback ---
+    function connectLiveUpdates() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+        liveEvents = new EventSource(`/api/together/events?space_id=${currentSpaceId}`);
+        liveEvents.onmessage = (e) => handleLiveEvent(JSON.parse(e.data));
+        liveEvents.onerror = () => {
+            // EventSource reconnects by itself unless the server refused the stream
+            if (liveEvents.readyState === EventSource.CLOSED) {
+                liveEvents = null;
+                startPolling();
+            }
+        };
+    }
+
+    function startPolling() {
+        if (historyPollInterval) return;
+        loadChatHistory();
+        historyPollInterval = setInterval(loadChatHistory, 3000);
+    }
+
+    function handleLiveEvent(evt) {
+        if (evt.type === 'ready') {
+            if (aiToggleCheckbox) aiToggleCheckbox.checked = evt.ai_active;
+            loadChatHistory(); // Fetch anything sent before we (re)subscribed
+        } else if (evt.type === 'message') {
+            renderIncoming(evt.message);
+        } else if (evt.type === 'ai_state') {
+            if (aiToggleCheckbox) aiToggleCheckbox.checked = evt.ai_active;
+        } else if (evt.type === 'expired') {
+            stopSession('Space expired. Thank you for chatting!');
+        }
+    }
+
+    function renderIncoming(m, quiet = false) {
+        // Live events arrive in insert order, which isn't always seq order: dedupe by seq, not by a high-water mark
+        if (!chatbox || m.seq <= lastSeq || seenSeqs.has(m.seq)) return;
+        const isMe = (m.sender === 'user' && m.sender_name === displayName);
+        if (isMe) {
+            // Replace the optimistic bubble added by sendMessage
+            const idx = pendingEchoes.findIndex(p => p.text === m.message);
+            if (idx !== -1) {
+                const [pending] = pendingEchoes.splice(idx, 1);
+                if (pending.el?.parentNode) pending.el.parentNode.removeChild(pending.el);
+            }
+        }
+        appendMessage(m.sender, m.message, m.time, m.sender_name, isMe, m.seq);
+        chatbox.scrollTop = chatbox.scrollHeight;
+        seenSeqs.add(m.seq);
+        while (seenSeqs.has(lastSeq + 1)) {
+            seenSeqs.delete(lastSeq + 1);
+            lastSeq++;
+        }
+        if (!quiet && m.sender === 'luvisa' && notifySound) notifySound.play().catch(e => console.warn("Audio err:", e));
+    }
+
     function stopSession(message) {
+        if (liveEvents) { liveEvents.close(); liveEvents = null; }
         clearInterval(historyPollInterval);
         clearInterval(timerInterval);
         alert(message);
@@ -189,7 +249,13 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!currentSpaceId || !chatbox) return;
 
         try {
-            const response = await fetch(`/api/together/history?space_id=${currentSpaceId}`);
+            // Only ask for messages after the newest one we have; 304 when nothing changed
+            const params = new URLSearchParams({ space_id: currentSpaceId });
+            if (lastSeq >= 0) params.set('since', lastSeq);
+            const headers = historyEtag ? { 'If-None-Match': historyEtag } : {};
+
+            const response = await fetch(`/api/together/history?${params}`, { headers: headers });
+            if (response.status === 304) return;
             if (!response.ok) {
                 if (response.status === 404) {
                     stopSession('This space has expired or was not found.');
@@ -199,22 +265,17 @@ document.addEventListener('DOMContentLoaded', () => {
             
             const data = await response.json();
             if (!data.success) return;
+            historyEtag = response.headers.get('ETag');
 
             if (aiToggleCheckbox) {
                 aiToggleCheckbox.checked = data.ai_active;
             }
 
-            if (data.history.length === lastMessageCount) return;
+            if (data.history.length === 0) return;
 
-            chatbox.innerHTML = ''; 
-            data.history.forEach(m => {
-                const isMe = (m.sender === 'user' && m.sender_name === displayName);
-                appendMessage(m.sender, m.message, m.time, m.sender_name, isMe);
-            });
-            chatbox.scrollTop = chatbox.scrollHeight;
-            lastMessageCount = data.history.length;
+            data.history.forEach(m => renderIncoming(m, true));
             
-            if (data.history.length > 0 && data.history[data.history.length - 1].sender === 'luvisa') {
+            if (data.history[data.history.length - 1].sender === 'luvisa') {
                 if(notifySound) notifySound.play().catch(e => console.warn("Audio err:", e));
             }
 
@@ -228,7 +289,8 @@ document.addEventListener('DOMContentLoaded', () => {
         const text = userInput.value.trim();
         if (!text) return;
 
-        appendMessage('user', text, null, displayName, true);
+        const pendingEl = appendMessage('user', text, null, displayName, true);
+        pendingEchoes.push({ text: text, el: pendingEl });
 
         userInput.value = '';
 
@@ -249,7 +311,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 return; 
             }
             
-            loadChatHistory(); 
+            // With live updates the echo arrives as an event; only pollers reload
+            if (!liveEvents) loadChatHistory(); 
             
         } catch (err) {
             appendMessage('luvisa', "Sorry, connection trouble 😥", null, "Luvisa 💗", false);
@@ -257,10 +320,11 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    function appendMessage(type, text, atTime = null, senderName = "A user", isMe = false) {
+    function appendMessage(type, text, atTime = null, senderName = "A user", isMe = false, seq = null) {
         if (!chatbox) return; 
         
         const wrapper = document.createElement('div'); 
+        if (seq !== null) wrapper.dataset.seq = seq;
         
         if (type === 'luvisa') {
             wrapper.className = 'message luvisa-message'; 
@@ -291,7 +355,10 @@ document.addEventListener('DOMContentLoaded', () => {
         bubble.appendChild(msg);
         bubble.appendChild(timeDiv);
         wrapper.appendChild(bubble); 
-        chatbox.appendChild(wrapper);
+        // A message that arrived late goes before the first one with a higher seq
+        const later = seq === null ? null
+            : Array.from(chatbox.querySelectorAll('[data-seq]')).find(el => Number(el.dataset.seq) > seq);
+        chatbox.insertBefore(wrapper, later || null);
         return wrapper;
     }
 